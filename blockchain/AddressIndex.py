@@ -0,0 +1,70 @@
+import os
+from array import array
+
+from Codec import decode, encode
+from Ledger import indexed_transactions
+
+
+class AddressIndex:     # 地址 -> 相关交易位置 (区块高度, 交易序号), 随出块增量更新
+    def __init__(self):
+        self.positions = {}     # 地址 -> array('I'), 依次存放 高度, 序号, 高度, 序号 ...
+        self.height = -1        # 已索引到的区块高度
+        self.tip = None         # 该高度的区块 hash, 重新打开时据此判断索引是否属于当前链
+
+    def apply_block(self, block):
+        height = self.height + 1
+        for index, transaction in indexed_transactions(block):
+            for address in (transaction['sender'], transaction['recipient']):
+                positions = self.positions.get(address)
+                if positions is None:
+                    positions = self.positions[address] = array('I')
+                elif positions[-2] == height and positions[-1] == index:    # 自己转给自己只记一次
+                    continue
+                positions.append(height)
+                positions.append(index)
+        self.height = height
+        self.tip = block.hash
+
+    def revert_block(self, block):      # 撤销链尾区块写入的位置
+        height = self.height
+        for index, transaction in reversed(list(indexed_transactions(block))):
+            for address in (transaction['recipient'], transaction['sender']):
+                positions = self.positions.get(address)
+                if positions and positions[-2] == height and positions[-1] == index:
+                    del positions[-2:]
+                    if not positions:
+                        del self.positions[address]
+        self.height = height - 1
+        self.tip = block.previous_hash if self.height >= 0 else None
+
+    def sync(self, chain):
+        for height in range(self.height + 1, len(chain)):
+            self.apply_block(chain[height])
+
+    def count(self, address):
+        return len(self.positions.get(address, ())) // 2
+
+    def history(self, address, page=0, page_size=50):     # 分页返回 [(高度, 序号)], 最新的在前, O(page_size)
+        positions = self.positions.get(address, ())
+        end = len(positions) - page * page_size * 2
+        start = max(end - page_size * 2, 0)
+        return [(positions[i], positions[i + 1]) for i in range(end - 2, start - 2, -2)]
+
+    def save(self, path):       # 写临时文件后替换, 中途崩溃不会留下半个索引
+        record = [self.height, self.tip, [[address, positions.tobytes()] for address, positions in self.positions.items()]]
+        with open(path + '.tmp', 'wb') as f:
+            f.write(encode(record))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+
+    def load(self, path):
+        with open(path, 'rb') as f:
+            record = decode(f.read())
+        if len(record) == 2:        # 旧格式没有记录 hash, 按不属于当前链处理
+            record = [record[0], None, record[1]]
+        self.height, self.tip, entries = record
+        self.positions = {}
+        for address, raw in entries:
+            positions = self.positions[address] = array('I')
+            positions.frombytes(raw)
@@ -1,14 +1,89 @@
 import hashlib
+import struct
 import time
 
+from Codec import decode, encode
+from Merkle import leaf_hash, merkle_root
+from Mining import NONCE, mine, target
+
+HEADER = struct.Struct('>d32s32s32sBQ')     # 区块头 113 字节, 最后 8 字节为 nonce
+
 class Block:
-    def __init__(self,data,previous_hash):
+    def __init__(self,data,previous_hash,difficulty=0,workers=1,state_root=bytes(32)):
         self.timestamp=time.time()  # 创建时间
         self.data = data            # 当前数据
         self.previous_hash = previous_hash  # 前一个hash
+        self.state_root = state_root        # 出块后余额状态的 Merkle 根, 轻客户端据此验证余额
+        self.data_root = None               # 缓存的数据摘要, 区块头不必每次重建 Merkle 树
+        self.difficulty = difficulty        # 工作量证明难度, hash 的前导 0 位数
+        self.nonce = 0
+        if difficulty:
+            self.nonce = mine(self.header[:-NONCE.size],difficulty,workers)
         self.hash = self.calculate_hash()   # 当前hash
 
-    def calculate_hash(self):     # 创建hash
-        data = str(self.timestamp)+str(self.data)+str(self.previous_hash)
-        return hashlib.sha256(data.encode()).hexdigest()
-        
\ No newline at end of file
+    def calculate_hash(self):     # 创建hash, 校验时按当前数据重新计算数据摘要
+        self.data_root = data_digest(self.data)
+        return hashlib.sha256(self.header).hexdigest()
+
+    @property
+    def header(self):
+        return block_header(self.timestamp,self.merkle_root,to_digest(self.previous_hash),self.difficulty,self.nonce,self.state_root)
+
+    @property
+    def merkle_root(self):
+        if self.data_root is None:
+            self.data_root = data_digest(self.data)
+        return self.data_root
+
+    def meets_target(self):
+        return int(self.hash,16) < target(self.difficulty)
+
+    def to_record(self):        # 存储记录: [区块头, hash, 数据]
+        return [self.header,bytes.fromhex(self.hash),self.data]
+
+    @classmethod
+    def from_record(cls,record):    # 从存储记录恢复, 不重新计算 hash
+        header,digest,data = record
+        block = cls.__new__(cls)
+        block.timestamp,block.data_root,previous_digest,block.state_root,block.difficulty,block.nonce = HEADER.unpack(header)
+        block.data = data
+        block.previous_hash = previous_digest.hex()
+        block.hash = digest.hex()
+        return block
+
+
+def block_header(timestamp,data_digest,previous_digest,difficulty=0,nonce=0,state_root=bytes(32)):
+    # 定长区块头: 时间戳 + 数据摘要(交易 Merkle 根) + 前一个hash + 状态根 + 难度 + nonce, nonce 放在末尾便于挖矿时复用前缀
+    return HEADER.pack(timestamp,data_digest,previous_digest,state_root,difficulty,nonce)
+
+
+def header_previous(header):    # 从区块头直接取字段, 不必恢复整个区块
+    return header[40:72]
+
+
+def header_state_root(header):
+    return header[72:104]
+
+
+def header_difficulty(header):
+    return header[104]
+
+
+def data_digest(data):      # 交易列表取 Merkle 根, 其他数据直接取编码的 sha256
+    if isinstance(data, list):
+        return merkle_root([leaf_hash(transaction) for transaction in data])
+    return hashlib.sha256(encode(data)).digest()
+
+
+def to_digest(block_hash):      # 十六进制 hash 转 32 字节, 创世区块的 "0" 记为全 0
+    if len(block_hash) == 64:
+        return bytes.fromhex(block_hash)
+    return bytes(32)
+
+
+def encode_block(block):
+    return encode(block.to_record())
+
+
+def decode_block(raw,block_class=Block):
+    return block_class.from_record(decode(raw))
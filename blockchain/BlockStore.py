@@ -0,0 +1,175 @@
+import hashlib
+import mmap
+import os
+import struct
+
+from Block import Block, decode_block, encode_block
+
+INDEX_ENTRY = struct.Struct('>IQI32s')     # 定长索引项: 段号, 段内偏移, 记录长度, 区块 hash
+HASH_OFFSET = 16        # 索引项中 hash 的偏移
+
+
+class BlockStore:       # 追加写的区块文件存储, 可以代替 list 作为 chain 使用
+    def __init__(self,path,block_class=Block,segment_size=256 * 1024 * 1024,sync_every=100):
+        self.path = path
+        self.block_class = block_class
+        self.segment_size = segment_size    # 单个段文件的大小上限
+        self.sync_every = sync_every        # 每追加多少个区块 fsync 一次
+        self.unsynced = 0
+        self.maps = {}                      # 段号 -> mmap
+        self.tip = None                     # 最后一个区块, 追加和读链尾时不必再解码
+        os.makedirs(path, exist_ok=True)
+        self.index = bytearray(self.read_file(self.index_path()))
+        self.recover()
+        self.segment_no, self.segment_end = self.tail_position()
+        self.segment = open(self.segment_path(self.segment_no), 'ab')
+        self.index_file = open(self.index_path(), 'ab')
+
+    def index_path(self):
+        return os.path.join(self.path, 'blocks.idx')
+
+    def segment_path(self,segment_no):
+        return os.path.join(self.path, 'blocks-%05d.dat' % segment_no)
+
+    def read_file(self,path):
+        if not os.path.exists(path):
+            return b''
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def recover(self):      # 丢弃崩溃时写了一半的索引项和段尾数据
+        count = len(self.index) // INDEX_ENTRY.size
+        sizes = {}
+        while count:
+            segment_no, offset, length, _ = self.entry(count - 1)
+            if segment_no not in sizes:
+                path = self.segment_path(segment_no)
+                sizes[segment_no] = os.path.getsize(path) if os.path.exists(path) else 0
+            if offset + length <= sizes[segment_no]:
+                break
+            count -= 1
+        if count * INDEX_ENTRY.size != len(self.index):
+            del self.index[count * INDEX_ENTRY.size:]
+            with open(self.index_path(), 'r+b' if os.path.exists(self.index_path()) else 'wb') as f:
+                f.truncate(len(self.index))
+        segment_no, end = self.tail_position()
+        path = self.segment_path(segment_no)
+        if os.path.exists(path) and os.path.getsize(path) > end:
+            with open(path, 'r+b') as f:
+                f.truncate(end)
+
+    def tail_position(self):
+        if not self.index:
+            return 0, 0
+        segment_no, offset, length, _ = self.entry(len(self) - 1)
+        return segment_no, offset + length
+
+    def entry(self,height):
+        return INDEX_ENTRY.unpack_from(self.index, height * INDEX_ENTRY.size)
+
+    def __len__(self):
+        return len(self.index) // INDEX_ENTRY.size
+
+    def __getitem__(self,height):
+        if isinstance(height, slice):
+            return [self[i] for i in range(*height.indices(len(self)))]
+        if height < 0:
+            height += len(self)
+        if not 0 <= height < len(self):
+            raise IndexError('block height out of range')
+        if height == len(self) - 1:
+            if self.tip is None:
+                self.tip = decode_block(self.read(height), self.block_class)
+            return self.tip
+        return decode_block(self.read(height), self.block_class)
+
+    def hash_at(self,height):      # 直接从索引取区块 hash, 不读区块记录
+        if height < 0:
+            height += len(self)
+        return self.entry(height)[3].hex()
+
+    def hash_digest(self,stop):     # 高度 < stop 的区块 hash 的摘要, 按字节列从索引中切片, 不逐个解析索引项
+        index = bytes(self.index[:stop * INDEX_ENTRY.size])
+        return hashlib.sha256(b''.join(index[HASH_OFFSET + i::INDEX_ENTRY.size] for i in range(32))).digest()
+
+    def __iter__(self):
+        for height in range(len(self)):
+            yield self[height]
+
+    def read(self,height):     # 通过 mmap 按高度随机读取区块记录
+        segment_no, offset, length, _ = self.entry(height)
+        segment = self.maps.get(segment_no)
+        if segment is None or offset + length > len(segment):
+            if segment_no == self.segment_no:
+                self.segment.flush()
+            if segment is not None:
+                segment.close()
+            with open(self.segment_path(segment_no), 'rb') as f:
+                segment = self.maps[segment_no] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return segment[offset:offset+length]
+
+    def append(self,block):
+        self.extend([block])
+
+    def extend(self,blocks):     # 先写完整批记录, 再一次写入这批索引项
+        entries = []
+        for block in blocks:
+            record = encode_block(block)
+            if self.segment_end and self.segment_end + len(record) > self.segment_size:
+                self.roll_segment()
+            self.segment.write(record)
+            entries.append(INDEX_ENTRY.pack(self.segment_no, self.segment_end, len(record), bytes.fromhex(block.hash)))
+            self.segment_end += len(record)
+            last = block
+        if not entries:
+            return
+        entries = b''.join(entries)
+        self.index_file.write(entries)
+        self.index += entries
+        self.tip = last
+        self.unsynced += len(entries) // INDEX_ENTRY.size
+        if self.unsynced >= self.sync_every:
+            self.sync()
+
+    def truncate(self,length):     # 丢弃高度 >= length 的区块, 用于分叉切换
+        if length >= len(self):
+            return
+        self.sync()
+        self.tip = None
+        del self.index[length * INDEX_ENTRY.size:]
+        self.index_file.truncate(len(self.index))
+        segment_no, end = self.tail_position()
+        for number in list(self.maps):
+            if number >= segment_no:
+                self.maps.pop(number).close()
+        self.segment.close()
+        for number in range(segment_no + 1, self.segment_no + 1):
+            if os.path.exists(self.segment_path(number)):
+                os.remove(self.segment_path(number))
+        with open(self.segment_path(segment_no), 'r+b') as f:
+            f.truncate(end)
+        self.segment_no, self.segment_end = segment_no, end
+        self.segment = open(self.segment_path(segment_no), 'ab')
+        self.sync()
+
+    def roll_segment(self):
+        self.sync()
+        self.segment.close()
+        self.segment_no += 1
+        self.segment_end = 0
+        self.segment = open(self.segment_path(self.segment_no), 'ab')
+
+    def sync(self):     # 先落盘段数据再落盘索引, 索引项只会指向已持久化的记录
+        self.segment.flush()
+        os.fsync(self.segment.fileno())
+        self.index_file.flush()
+        os.fsync(self.index_file.fileno())
+        self.unsynced = 0
+
+    def close(self):
+        self.sync()
+        self.segment.close()
+        self.index_file.close()
+        for segment in self.maps.values():
+            segment.close()
+        self.maps = {}
@@ -0,0 +1,55 @@
+class BlockTree:        # 以 hash 为键的区块树, 记录每个区块的高度和累计工作量, 支持分叉
+    def __init__(self, max_depth=1000):
+        self.max_depth = max_depth      # 只保留距链尾这么多高度以内的区块, 更深的分叉不再处理
+        self.nodes = {}     # hash -> TreeNode
+
+    def __contains__(self, block_hash):
+        return block_hash in self.nodes
+
+    def get(self, block_hash):
+        return self.nodes.get(block_hash)
+
+    def add(self, block, height):
+        parent = self.nodes.get(block.previous_hash)
+        work = (parent.work if parent is not None else 0) + block_work(block)   # 树中最早的区块以 0 为基准
+        node = self.nodes[block.hash] = TreeNode(block, height, work)
+        return node
+
+    def remove(self, block_hash):       # 去掉无效区块, 之后不会再切换到它所在的分支
+        self.nodes.pop(block_hash, None)
+
+    def fork_point(self, a, b):     # 两个节点的最近公共祖先, O(分叉深度)
+        while a is not b:
+            if a is None or b is None:
+                return None
+            if a.height >= b.height:
+                a = self.nodes.get(a.block.previous_hash)
+            else:
+                b = self.nodes.get(b.block.previous_hash)
+        return a
+
+    def branch(self, tip, ancestor):    # 从 ancestor 之后到 tip 的区块, 按高度升序
+        blocks = []
+        node = tip
+        while node is not ancestor:
+            blocks.append(node.block)
+            node = self.nodes[node.block.previous_hash]
+        blocks.reverse()
+        return blocks
+
+    def prune(self, tip_height):
+        if len(self.nodes) > self.max_depth * 2:
+            self.nodes = {key: node for key, node in self.nodes.items() if node.height > tip_height - self.max_depth}
+
+
+class TreeNode:
+    __slots__ = ('block', 'height', 'work')
+
+    def __init__(self, block, height, work):
+        self.block = block
+        self.height = height
+        self.work = work
+
+
+def block_work(block):      # 满足难度 d 平均需要 2**d 次哈希
+    return 1 << block.difficulty
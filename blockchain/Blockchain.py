@@ -1,22 +1,127 @@
+import hashlib
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 from Block import Block
 
 class Blockchain:       # 区块链
-    def __init__(self):
-        self.chain = [self.create_genessis_block()]        # Block 数组
+    def __init__(self,block_class=Block,store=None):
+        self.block_class = block_class      # Block 或 CompactBlock
+        self.chain = store if store is not None else []     # Block 数组, 或持久化的 BlockStore
+        if len(self.chain) == 0:
+            self.chain.append(self.create_genessis_block())
+        self.verified_height = -1       # 已校验到的高度
+        self.verified_tip = None        # 已校验高度处的区块 hash
+        self.verified_digest = None     # 已校验区块的已存 hash 的摘要
     def create_genessis_block(self):
-        return Block("Genesis Block","0")
+        return self.block_class("Genesis Block","0")
     
     def add_block(self,data):
         previous_block = self.chain[-1]
-        new_block=Block(data,previous_block.hash)
+        new_block=self.block_class(data,previous_block.hash)
         self.chain.append(new_block)
 
-    def validate_chain(self):
-        for i in range(1,len(self.chain)):
-            current_block = self.chain[i]
-            previous_block=self.chain[i-1]
-            if current_block.hash!=current_block.calculate_hash():
-                return False
-            if current_block.previous_hash != previous_block.hash:
-                return False
-        return True
\ No newline at end of file
+    def validate_chain(self,incremental=False,parallel=False,workers=None):
+        # incremental=True 时只校验检查点之后新增的区块, 检查点失效则回退到全量校验
+        # parallel=True 时把区块分段交给进程池校验
+        start = self.verified_height + 1 if incremental and self.checkpoint_valid() else 1
+        if self.find_invalid_block(start,parallel,workers) is not None:
+            self.verified_height = -1       # 校验失败后检查点作废, 下次增量校验回到全量
+            self.verified_tip = None
+            self.verified_digest = None
+            return False
+        self.verified_height = len(self.chain) - 1
+        self.verified_tip = self.chain[-1].hash
+        self.verified_digest = stored_digest(self.chain, len(self.chain))
+        return True
+
+    def find_invalid_block(self,start=1,parallel=False,workers=None):      # 返回第一个无效区块的下标, 全部有效返回 None
+        start = max(start, 1)
+        return find_invalid(self.chain[start:], self.chain[start-1].hash, start, parallel, workers)
+
+    def extend(self,blocks,parallel=False,workers=None):     # 批量导入已有区块: 全部校验通过后一次性追加
+        blocks = list(blocks)
+        if not blocks:
+            return
+        invalid = check_links(blocks, self.chain[-1].hash, len(self.chain))
+        if invalid is None:
+            invalid = find_invalid(blocks, self.chain[-1].hash, len(self.chain), parallel, workers)
+        if invalid is not None:
+            raise ValueError("无效区块: 高度 %d" % invalid)
+        self.chain.extend(blocks)
+
+    def checkpoint_valid(self):    # 检查点之前的已存 hash 没有被改动
+        if self.verified_digest is None or self.verified_height >= len(self.chain):
+            return False
+        if self.chain[self.verified_height].hash != self.verified_tip:
+            return False
+        return stored_digest(self.chain, self.verified_height + 1) == self.verified_digest
+
+
+_shared = None      # fork 出的校验进程直接继承的 (区块, 段首前一个 hash), 不经过 pickle
+
+
+def find_invalid(blocks,previous_hash,offset,parallel=False,workers=None):
+    # 校验紧接在 previous_hash 之后的一段区块, 返回第一个无效区块的高度(offset 为 blocks[0] 的高度)
+    global _shared
+    if not parallel or len(blocks) < 2:
+        return check_range(blocks, previous_hash, offset)
+    workers = workers or os.cpu_count() or 1
+    step = -(-len(blocks) // (workers * 4))     # 每个进程分到约 4 段, 便于负载均衡
+    if 'fork' in multiprocessing.get_all_start_methods():
+        # 子进程 fork 时继承区块列表, 每段只发送 (起点, 终点, 高度)
+        context = multiprocessing.get_context('fork')
+        ranges = [(lo, min(lo + step, len(blocks)), offset) for lo in range(0, len(blocks), step)]
+        check = check_shared
+        _shared = (blocks, previous_hash)
+    else:       # 不支持 fork 的平台只能把区块序列化发给子进程
+        context = None
+        ranges = [(blocks[lo:lo+step], blocks[lo-1].hash if lo else previous_hash, offset + lo) for lo in range(0, len(blocks), step)]
+        check = check_range_args
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            # 结果按分段顺序返回, 第一个非 None 即为第一个无效区块
+            for invalid in executor.map(check, ranges):
+                if invalid is not None:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    return invalid
+    finally:
+        _shared = None
+    return None
+
+
+def check_links(blocks,previous_hash,offset):     # 只比较已存 hash, 一次列表比较完成整批链接校验
+    previous = [block.previous_hash for block in blocks]
+    expected = [previous_hash] + [block.hash for block in blocks[:-1]]
+    if previous == expected:
+        return None
+    return offset + next(i for i, (a, b) in enumerate(zip(previous, expected)) if a != b)
+
+
+def check_range(blocks,previous_hash,offset):   # 校验一段连续区块, 段首与前一区块的链接由 previous_hash 给出
+    for i,current_block in enumerate(blocks):
+        if current_block.hash!=current_block.calculate_hash():
+            return offset + i
+        if current_block.difficulty and not current_block.meets_target():
+            return offset + i
+        if current_block.previous_hash != previous_hash:
+            return offset + i
+        previous_hash = current_block.hash
+    return None
+
+
+def check_range_args(args):
+    return check_range(*args)
+
+
+def check_shared(args):     # 在 fork 出的进程中校验继承的区块列表 [lo, hi)
+    lo, hi, offset = args
+    blocks, previous_hash = _shared
+    return check_range(blocks[lo:hi], blocks[lo-1].hash if lo else previous_hash, offset + lo)
+
+
+def stored_digest(chain, stop):     # 高度 < stop 的已存 hash 的摘要, 只读取 hash, 不重新计算区块 hash
+    if hasattr(chain, 'hash_digest'):       # BlockStore 直接从索引读取, 不解码区块
+        return chain.hash_digest(stop)
+    return hashlib.sha256(''.join([block.hash for block in chain[:stop]]).encode()).digest()
@@ -0,0 +1,111 @@
+import base64
+import hashlib
+import json
+import struct
+
+from Block import Block, decode_block, encode_block
+
+# 二进制格式: 文件头 MAGIC, 之后是若干段;
+# 段 = 4 字节区块数 + 4 字节段长度 + 段内容(每个区块 4 字节长度 + 规范编码记录) + 32 字节段内容 sha256
+MAGIC = b'CHAIN1\n'
+SEGMENT = struct.Struct('>II')
+LENGTH = struct.Struct('>I')
+
+
+def export_chain(blocks, f, segment_blocks=1000):   # 流式写出, 内存中最多保留一段
+    f.write(MAGIC)
+    count = 0
+    for segment in segments(blocks, segment_blocks):
+        body = b''.join(LENGTH.pack(len(record)) + record for record in map(encode_block, segment))
+        f.write(SEGMENT.pack(len(segment), len(body)))
+        f.write(body)
+        f.write(hashlib.sha256(body).digest())
+        count += len(segment)
+    return count
+
+
+def import_chain(f, block_class=Block):     # 生成器, 逐个产出区块; 段校验失败抛出 ValueError
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError("不是区块链导出文件")
+    while True:
+        head = f.read(SEGMENT.size)
+        if not head:
+            return
+        if len(head) != SEGMENT.size:
+            raise ValueError("段头不完整")
+        count, size = SEGMENT.unpack(head)
+        body = f.read(size)
+        if len(body) != size or hashlib.sha256(body).digest() != f.read(32):
+            raise ValueError("段校验失败")
+        pos = 0
+        for _ in range(count):
+            length = LENGTH.unpack_from(body, pos)[0]
+            yield decode_block(body[pos+4:pos+4+length], block_class)
+            pos += 4 + length
+
+
+def import_into(target, blocks, batch_blocks=1000, parallel=False, workers=None):
+    # 分批交给 Blockchain/Cryptocurrency.extend, 内存只保留一批区块
+    count = 0
+    for batch in segments(blocks, batch_blocks):
+        target.extend(batch, parallel, workers)
+        count += len(batch)
+    return count
+
+
+def export_jsonl(blocks, f):    # 调试格式: 每行一个区块, 二进制字段为 base64
+    count = 0
+    for block in blocks:
+        header, digest, data = block.to_record()
+        f.write(json.dumps({'height': count, 'hash': digest.hex(), 'header': header.hex(), 'data': to_json(data)}, ensure_ascii=False))
+        f.write('\n')
+        count += 1
+    return count
+
+
+def import_jsonl(f, block_class=Block):
+    for line in f:
+        if line.strip():
+            item = json.loads(line)
+            yield block_class.from_record([bytes.fromhex(item['header']), bytes.fromhex(item['hash']), from_json(item['data'])])
+
+
+def to_json(value):     # 公钥和字节串用带标记的字典表示, 保证可以还原
+    if isinstance(value, list):
+        return [to_json(item) for item in value]
+    if isinstance(value, dict):
+        return {key: to_json(item) for key, item in value.items()}
+    if isinstance(value, (bytes, bytearray)):
+        return {'$bytes': base64.b64encode(value).decode()}
+    if hasattr(value, 'save_pkcs1'):
+        return {'$rsa': value.save_pkcs1(format='DER').hex()}
+    if hasattr(value, 'ed25519'):
+        return {'$ed25519': value.ed25519.hex()}
+    return value
+
+
+def from_json(value):
+    if isinstance(value, list):
+        return [from_json(item) for item in value]
+    if isinstance(value, dict):
+        if '$bytes' in value:
+            return base64.b64decode(value['$bytes'])
+        if '$rsa' in value:
+            from Codec import decode_pubkey
+            return decode_pubkey(bytes.fromhex(value['$rsa']))
+        if '$ed25519' in value:
+            from KeyProvider import EdPublicKey
+            return EdPublicKey(bytes.fromhex(value['$ed25519']))
+        return {key: from_json(item) for key, item in value.items()}
+    return value
+
+
+def segments(blocks, size):
+    segment = []
+    for block in blocks:
+        segment.append(block)
+        if len(segment) == size:
+            yield segment
+            segment = []
+    if segment:
+        yield segment
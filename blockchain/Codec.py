@@ -0,0 +1,236 @@
+import struct
+
+# 规范二进制编码: 每个值 = 1 字节类型标记 + 定长数值或 4 字节长度前缀的内容
+# 字典按键排序编码, 同一数据在任意 Python 版本下得到相同字节
+NONE = b'N'
+STR = b'S'
+BYTES = b'B'
+INT = b'I'      # 定长 8 字节有符号整数 (金额)
+FLOAT = b'F'
+LIST = b'L'
+DICT = b'D'
+PUBKEY = b'K'   # RSA 公钥, DER 编码
+ED25519 = b'E'  # Ed25519 公钥, 32 字节原始编码
+
+LENGTH = struct.Struct('>I')
+INT64 = struct.Struct('>q')
+DOUBLE = struct.Struct('>d')
+
+# 公钥缓存为两代近似 LRU: 当前代写满 CACHE_SIZE 项后整体降为旧代, 旧代中再次用到的项提升回当前代
+# 对端发来的数据也会进入缓存, 总量限制在 2 * CACHE_SIZE; 命中当前代时只有一次字典查找
+CACHE_SIZE = 10000
+_pubkey_cache = {}      # id(公钥) -> (公钥, 编码), 公钥 DER 编码较慢, 同一对象只编码一次
+_pubkey_cache_old = {}
+
+
+def encode(value):
+    parts = []
+    _encoder(value)(value, parts.append)
+    return b''.join(parts)
+
+
+def encode_transaction(transaction):
+    if type(transaction) is dict and transaction.keys() == TRANSACTION_KEYS:
+        return _encode_transaction(transaction)
+    return encode(transaction)
+
+
+def _encoder(value):
+    encoder = _ENCODERS.get(type(value))
+    if encoder is not None:
+        return encoder
+    if hasattr(value, 'save_pkcs1'):
+        return _encode_pubkey
+    if hasattr(value, 'ed25519'):
+        return _encode_ed25519
+    raise TypeError("不支持编码的类型: %r" % (value,))
+
+
+def _encode_str(value, write):
+    raw = value.encode()
+    write(STR + LENGTH.pack(len(raw)) + raw)
+
+
+def _encode_bytes(value, write):
+    write(BYTES + LENGTH.pack(len(value)) + bytes(value))
+
+
+def _encode_int(value, write):
+    write(INT + INT64.pack(value))
+
+
+def _encode_float(value, write):
+    write(FLOAT + DOUBLE.pack(value))
+
+
+def _encode_none(value, write):
+    write(NONE)
+
+
+def _encode_list(value, write):
+    write(LIST + LENGTH.pack(len(value)))
+    for item in value:
+        if type(item) is dict and item.keys() == TRANSACTION_KEYS:    # 交易走定长布局的快速路径
+            write(_encode_transaction(item))
+        else:
+            _encoder(item)(item, write)
+
+
+def _encode_dict(value, write):
+    write(DICT + LENGTH.pack(len(value)))
+    for key in sorted(value):
+        _encoder(key)(key, write)
+        item = value[key]
+        _encoder(item)(item, write)
+
+
+def _encode_pubkey(value, write):
+    write(pubkey_bytes(value))
+
+
+def _encode_ed25519(value, write):
+    write(ED25519 + LENGTH.pack(len(value.ed25519)) + value.ed25519)
+
+
+def pubkey_bytes(public_key):
+    global _pubkey_cache, _pubkey_cache_old
+    cached = _pubkey_cache.get(id(public_key))
+    if cached is None or cached[0] is not public_key:
+        cached = _pubkey_cache_old.get(id(public_key))
+        if cached is None or cached[0] is not public_key:
+            der = public_key.save_pkcs1(format='DER')
+            cached = (public_key, PUBKEY + LENGTH.pack(len(der)) + der)
+        if len(_pubkey_cache) >= CACHE_SIZE:
+            _pubkey_cache_old, _pubkey_cache = _pubkey_cache, {}
+        _pubkey_cache[id(public_key)] = cached
+    return cached[1]
+
+
+_ENCODERS = {
+    str: _encode_str,
+    bytes: _encode_bytes,
+    bytearray: _encode_bytes,
+    int: _encode_int,
+    float: _encode_float,
+    type(None): _encode_none,
+    list: _encode_list,
+    tuple: _encode_list,
+    dict: _encode_dict,
+}
+
+
+def _key(name):
+    parts = []
+    _encode_str(name, parts.append)
+    return parts[0]
+
+
+# {'amount','recipient','sender'} 交易按排序后的键预先拼好字段头, 与通用字典编码结果一致
+TRANSACTION_KEYS = {'amount', 'recipient', 'sender'}
+_AMOUNT_HEADER = DICT + LENGTH.pack(3) + _key('amount') + INT
+_RECIPIENT_HEADER = _key('recipient')
+_SENDER_HEADER = _key('sender')
+
+
+def _address_bytes(address):
+    if type(address) is str:
+        parts = []
+        _encode_str(address, parts.append)
+        return parts[0]
+    if hasattr(address, 'save_pkcs1'):
+        return pubkey_bytes(address)
+    return encode(address)      # Ed25519 等其他地址类型走通用编码
+
+
+def _encode_transaction(transaction):
+    return (_AMOUNT_HEADER + INT64.pack(transaction['amount'])
+            + _RECIPIENT_HEADER + _address_bytes(transaction['recipient'])
+            + _SENDER_HEADER + _address_bytes(transaction['sender']))
+
+
+def decode(buf):
+    value, pos = _decode(memoryview(buf), 0)
+    if pos != len(buf):
+        raise ValueError("编码数据末尾有多余字节")
+    return value
+
+
+def _decode(buf, pos):
+    tag = bytes(buf[pos:pos+1])
+    pos += 1
+    if tag == STR or tag == BYTES or tag == PUBKEY or tag == ED25519:
+        length = LENGTH.unpack_from(buf, pos)[0]
+        raw = bytes(buf[pos+4:pos+4+length])
+        pos += 4 + length
+        if tag == STR:
+            return raw.decode(), pos
+        if tag == PUBKEY:
+            return decode_pubkey(raw), pos
+        if tag == ED25519:
+            from KeyProvider import EdPublicKey
+            return EdPublicKey(raw), pos
+        return raw, pos
+    if tag == INT:
+        return INT64.unpack_from(buf, pos)[0], pos + 8
+    if tag == FLOAT:
+        return DOUBLE.unpack_from(buf, pos)[0], pos + 8
+    if tag == NONE:
+        return None, pos
+    if tag == LIST:
+        count = LENGTH.unpack_from(buf, pos)[0]
+        pos += 4
+        items = []
+        for _ in range(count):
+            item, pos = _decode(buf, pos)
+            items.append(item)
+        return items, pos
+    if tag == DICT:
+        count = LENGTH.unpack_from(buf, pos)[0]
+        pos += 4
+        value = {}
+        for _ in range(count):
+            key, pos = _decode(buf, pos)
+            value[key], pos = _decode(buf, pos)
+        return value, pos
+    raise ValueError("未知类型标记: %r" % tag)
+
+
+_decoded_pubkeys = {}   # DER -> 公钥, 同一地址解码为同一对象, 与编码缓存一样分两代
+_decoded_pubkeys_old = {}
+
+
+def decode_pubkey(der):
+    global _decoded_pubkeys, _decoded_pubkeys_old
+    public_key = _decoded_pubkeys.get(der)
+    if public_key is None:
+        public_key = _decoded_pubkeys_old.get(der)
+        if public_key is None:
+            import rsa      # 只有解码公钥时才需要 rsa
+            try:
+                public_key = rsa.PublicKey(*parse_rsa_der(der))
+            except ValueError:
+                public_key = rsa.PublicKey.load_pkcs1(der, format='DER')
+        if len(_decoded_pubkeys) >= CACHE_SIZE:
+            _decoded_pubkeys_old, _decoded_pubkeys = _decoded_pubkeys, {}
+        _decoded_pubkeys[der] = public_key
+    return public_key
+
+
+def parse_rsa_der(der):     # 直接解析 RSAPublicKey ::= SEQUENCE { n INTEGER, e INTEGER }, 比 pyasn1 快得多
+    pos = 0
+    values = []
+    for expected in (0x30, 0x02, 0x02):
+        if pos >= len(der) or der[pos] != expected:
+            raise ValueError("不是 RSA 公钥 DER")
+        length = der[pos + 1]
+        pos += 2
+        if length & 0x80:
+            size = length & 0x7f
+            length = int.from_bytes(der[pos:pos+size], 'big')
+            pos += size
+        if expected == 0x02:
+            values.append(int.from_bytes(der[pos:pos+length], 'big'))
+            pos += length
+    if pos != len(der):
+        raise ValueError("不是 RSA 公钥 DER")
+    return values
@@ -0,0 +1,67 @@
+import hashlib
+import struct
+import time
+
+from Block import block_header, data_digest, header_difficulty, header_previous, header_state_root, to_digest
+from Mining import NONCE, mine, target
+
+class CompactBlock:     # 紧凑区块: __slots__ + 缓存的定长区块头 + 32 字节原始 hash
+    __slots__ = ('data','header','digest')
+
+    def __init__(self,data,previous_hash,difficulty=0,workers=1,state_root=bytes(32)):
+        self.data = data            # 区块头已缓存数据摘要, data 创建后视为只读
+        self.header = block_header(time.time(),data_digest(data),to_digest(previous_hash),difficulty,0,state_root)
+        if difficulty:
+            prefix = self.header[:-NONCE.size]
+            self.header = prefix+NONCE.pack(mine(prefix,difficulty,workers))
+        self.digest = hashlib.sha256(self.header).digest()      # 区块 hash 的 32 字节原始形式, 创建时确定
+
+    def calculate_digest(self):     # 校验用: 按当前区块头和数据重新计算, 两者任一被改动时与 digest 不同
+        return hashlib.sha256(self.header[:8]+data_digest(self.data)+self.header[40:]).digest()
+
+    def calculate_hash(self):     # 与 Block 相同格式的十六进制 hash, 两种区块可以互相链接
+        return self.calculate_digest().hex()
+
+    @property
+    def timestamp(self):
+        return struct.unpack_from('>d',self.header)[0]
+
+    @property
+    def merkle_root(self):
+        return self.header[8:40]
+
+    @property
+    def previous_digest(self):
+        return header_previous(self.header)
+
+    @property
+    def state_root(self):
+        return header_state_root(self.header)
+
+    @property
+    def difficulty(self):
+        return header_difficulty(self.header)
+
+    @property
+    def nonce(self):
+        return NONCE.unpack_from(self.header,len(self.header)-NONCE.size)[0]
+
+    def meets_target(self):
+        return int.from_bytes(self.digest,'big') < target(self.difficulty)
+
+    @property
+    def hash(self):
+        return self.digest.hex()
+
+    @property
+    def previous_hash(self):
+        return self.previous_digest.hex()
+
+    def to_record(self):
+        return [self.header,self.digest,self.data]
+
+    @classmethod
+    def from_record(cls,record):    # 从存储记录恢复, 不重新计算 hash
+        block = cls.__new__(cls)
+        block.header,block.digest,block.data = record
+        return block
@@ -1,28 +1,295 @@
-from Block import Block
+import os
+
+from AddressIndex import AddressIndex
+from Block import Block, to_digest
+from Blockchain import check_links, find_invalid
+from BlockTree import BlockTree
+from Ledger import Ledger, transactions_of
+from Mempool import Mempool
+from Merkle import leaf_hash, merkle_proof
+from Snapshot import load_snapshot, save_snapshot
+from Transaction import SignatureVerifier, make_transaction, transaction_id
 
 
 class Cryptocurrency:
-    def __init__(self):
-        self.chain=[]
-        self.pending_transactions=[]
+    def __init__(self,store=None,difficulty=0,mining_workers=1,verify_signatures=True,verify_workers=1,
+                 mempool_bytes=64 * 1024 * 1024,max_block_bytes=None):
+        self.chain=store if store is not None else []     # 传入 BlockStore 时重启后沿用已有区块
+        self.mempool = Mempool(mempool_bytes)       # 待打包交易池
+        self.max_block_bytes = max_block_bytes      # 单个区块的交易字节数上限, None 表示打包全部
+        self.ledger = Ledger()      # 余额索引
+        self.address_index = AddressIndex()     # 地址 -> 交易位置
+        if self.index_path() and os.path.exists(self.index_path()):
+            self.address_index.load(self.index_path())
+            height = self.address_index.height
+            # 索引比区块文件新(区块未落盘), 或该高度的区块已被分叉切换替换(切换后未正常关闭), 重新建立
+            if height >= len(self.chain) or (height >= 0 and self.chain.hash_at(height) != self.address_index.tip):
+                self.address_index = AddressIndex()
+        self.difficulty = difficulty            # 出块的工作量证明难度
+        self.mining_workers = mining_workers    # 挖矿进程数
+        self.verify_signatures = verify_signatures      # 出块时丢弃签名无效的交易
+        self.verifier = SignatureVerifier(verify_workers)
+        self.tree = BlockTree()     # 最近区块及分叉, 用于最长链选择
+        start = max(0,len(self.chain)-self.tree.max_depth)      # 重新打开的链载入最近 max_depth 个区块, 之后分叉的分支才能切换
+        for height in range(start,len(self.chain)):
+            self.tree.add(self.chain[height],height)
 
     def create_genesis_block(self):
         genesis_block = Block("Genesis Block","0")
-        self.chain.append(genesis_block)
-
-    def mine_block(self,miner_address):
-        block_data="Block reward + "+str(miner_address)
-        self.pending_transactions.append(block_data)
-        previous_block = self.chain[-1]
-        new_block = Block(self.pending_transactions,previous_block.hash)
-        self.chain.append(new_block)
-        self.pending_transactions=[]
-
-    def add_transaction(self,sender,recipient,amount):
-        transaction = {
-          'sender': sender,
-            'recipient': recipient,
-            'amount': amount
-        }
-        self.pending_transactions.append(transaction)
+        self.append(genesis_block)
+
+    @property
+    def pending_transactions(self):
+        return self.mempool.transactions()
+
+    def block_template(self,miner_address,max_block_bytes=None):    # 出块模板: (交易, 父区块 hash, 出块后的状态根), 都取自当前链尾
+        selected = self.mempool.pop_best(max_block_bytes or self.max_block_bytes)
+        self.ledger.sync(self.chain)
+        transactions = self.sequenced(self.verified_transactions(selected))
+        transactions.append({'miner': miner_address})      # 出块奖励记录, 本块手续费记给矿工
+        return transactions,self.chain[-1].hash,self.ledger.state_root(transactions)
+
+    def mine_block(self,miner_address,max_block_bytes=None):
+        transactions,previous_hash,state_root = self.block_template(miner_address,max_block_bytes)
+        new_block = Block(transactions,previous_hash,self.difficulty,self.mining_workers,state_root)
+        self.append(new_block)
+        return new_block
+
+    def add_block(self,block):      # 接收其他节点的区块: 校验 hash、链接、难度和签名后追加到链尾
+        if len(self.chain):
+            previous_hash = self.chain[-1].hash
+        elif to_digest(block.previous_hash) == bytes(32):      # 空链只接受创世区块
+            previous_hash = block.previous_hash
+        else:
+            raise ValueError("空链只能追加创世区块")
+        self.check_block(block,previous_hash,len(self.chain))
+        self.check_state(block)
+        self.append(block)
+        self.mempool_remove(block)
+
+    def extend(self,blocks,parallel=False,workers=None):     # 批量导入区块: 与 add_block 相同的校验, 整批通过(hash 可并行校验)后一次性追加
+        blocks = list(blocks)
+        if not blocks:
+            return
+        if len(self.chain):
+            previous_hash = self.chain[-1].hash
+        elif to_digest(blocks[0].previous_hash) == bytes(32):
+            previous_hash = blocks[0].previous_hash
+        else:
+            raise ValueError("空链只能从创世区块开始导入")
+        self.check_blocks(blocks,previous_hash,len(self.chain),parallel,workers)
+        self.check_states(blocks)
+        self.chain.extend(blocks)
+        recent = blocks
+        if len(blocks) > self.tree.max_depth:      # 只有最近的区块可能参与分叉
+            self.tree = BlockTree(self.tree.max_depth)
+            recent = blocks[-self.tree.max_depth:]
+        for i,block in enumerate(recent,len(self.chain)-len(recent)):
+            self.tree.add(block,i)
+        self.tree.prune(len(self.chain)-1)
+        if len(self.mempool):
+            for block in blocks:
+                self.mempool_remove(block)
+
+    def receive_block(self,block):      # 接收可能位于分叉上的区块, 返回 'extended' / 'side' / 'reorg' / 'known'
+        if block.hash in self.tree:
+            return 'known'
+        parent = self.tree.get(block.previous_hash)
+        if parent is None:
+            if not len(self.chain):
+                self.add_block(block)
+                return 'extended'
+            raise ValueError("父区块未知: %s" % block.previous_hash)
+        self.check_block(block,parent.block.hash,parent.height+1)
+        if parent.block.hash == self.chain[-1].hash:
+            self.check_state(block)
+            self.append(block)
+            self.mempool_remove(block)
+            return 'extended'
+        node = self.tree.add(block,parent.height+1)
+        if node.work > self.tree.get(self.chain[-1].hash).work:
+            self.reorg(node)
+            return 'reorg'
+        return 'side'
+
+    def reorg(self,node):       # 切换到工作量更大的分支, 只撤销和重放分叉点之后的区块
+        tip = self.tree.get(self.chain[-1].hash)
+        fork = self.tree.fork_point(tip,node)
+        if fork is None:
+            raise ValueError("分叉点超出保留深度")
+        old_branch = self.tree.branch(tip,fork)
+        new_branch = self.tree.branch(node,fork)
+        self.sync_indexes()
+        for block in reversed(old_branch):
+            self.ledger.revert_block(block)
+            self.address_index.revert_block(block)
+        self.truncate(fork.height+1)
+        for i,block in enumerate(new_branch):     # 重放时逐个检查状态根
+            try:
+                self.check_state(block)
+            except ValueError:      # 撤销已重放的区块, 回到旧分支, 无效区块及其后代不再参与选择
+                self.ledger.sync(self.chain)
+                for applied in reversed(new_branch[:i]):
+                    self.ledger.revert_block(applied)
+                self.truncate(fork.height+1)
+                for restored in old_branch:
+                    self.chain.append(restored)
+                self.sync_indexes()
+                for invalid in new_branch[i:]:
+                    self.tree.remove(invalid.hash)
+                raise
+            self.chain.append(block)
+        self.sync_indexes()
+        for block in old_branch:    # 旧分支上没有进入新分支的交易回到交易池
+            for transaction in transactions_of(block):
+                self.accept_transaction(transaction)
+        for block in new_branch:
+            self.mempool_remove(block)
+
+    def truncate(self,height):      # 只改链本身, 索引由调用方撤销
+        if hasattr(self.chain,'truncate'):
+            self.chain.truncate(height)
+        else:
+            del self.chain[height:]
+
+    def check_block(self,block,previous_hash,height):
+        self.check_blocks([block],previous_hash,height)
+
+    def check_blocks(self,blocks,previous_hash,height,parallel=False,workers=None):
+        # add_block/receive_block 与 extend 共用的校验: 链接、hash 和工作量、难度下限、签名; 状态根由 check_states 检查
+        invalid = check_links(blocks,previous_hash,height)
+        if invalid is None:
+            invalid = find_invalid(blocks,previous_hash,height,parallel,workers)
+        if invalid is None:
+            invalid = next((height+i for i,block in enumerate(blocks) if height+i and block.difficulty < self.difficulty),None)
+        if invalid is not None:
+            raise ValueError("无效区块: 高度 %d" % invalid)
+        transactions = [transaction for block in blocks for transaction in transactions_of(block)]
+        if self.verify_signatures and not all(self.verifier.verify(transactions)):
+            raise ValueError("区块包含签名无效的交易")
+        nonces = [(transaction['sender'],transaction['nonce']) for transaction in transactions if 'nonce' in transaction]
+        if len(set(nonces)) != len(nonces):     # 与链上状态的比较在 check_states 中按区块顺序进行
+            raise ValueError("区块包含重复的交易 nonce")
+
+    def check_state(self,block):      # 延长链尾的区块: 状态根必须与本地余额应用区块后的结果一致
+        self.check_states([block])
+
+    def check_states(self,blocks):      # 依次应用并检查每个区块的状态根, 失败时撤销本批已应用的区块
+        self.ledger.sync(self.chain)
+        for i,block in enumerate(blocks):
+            if not self.ledger.check_nonces(block):
+                for applied in reversed(blocks[:i]):
+                    self.ledger.revert_block(applied)
+                raise ValueError("区块包含已用过或不连续的交易 nonce: 高度 %d" % (len(self.chain)+i))
+            self.ledger.apply_block(block)
+            if self.ledger.state_root() != block.state_root:
+                for applied in reversed(blocks[:i+1]):
+                    self.ledger.revert_block(applied)
+                raise ValueError("区块状态根不一致: 高度 %d" % (len(self.chain)+i))
+
+    def append(self,block):
+        if len(self.chain) and block.previous_hash != self.chain[-1].hash:
+            raise ValueError("区块没有链接到链尾: %s" % block.hash)
+        self.chain.append(block)
+        self.tree.add(block,len(self.chain)-1)
+        self.tree.prune(len(self.chain)-1)
+        self.sync_indexes()
+
+    def mempool_remove(self,block):    # 已上链的交易移出交易池
+        for transaction in transactions_of(block):
+            self.mempool.remove(transaction_id(transaction))
+
+    def add_transaction(self,sender,recipient,amount,signature=None,fee=0,nonce=None):
+        transaction = make_transaction(sender,recipient,amount,fee,nonce)
+        if signature is not None:
+            transaction['signature'] = signature
+        return self.accept_transaction(transaction)
+
+    def accept_transaction(self,transaction):     # 进入交易池前拒绝 nonce 已用过的交易, 已上链的签名交易不能被重放
+        if 'nonce' in transaction:
+            nonce = transaction['nonce']
+            self.ledger.sync(self.chain)
+            if type(nonce) is not int or nonce < self.ledger.next_nonce(transaction['sender']):
+                return None
+        return self.mempool.add(transaction)
+
+    def next_nonce(self,address):       # 地址下一笔交易应使用的 nonce, 包括交易池中排队的交易
+        self.ledger.sync(self.chain)
+        pending = self.mempool.pending_nonce(address)
+        nonce = self.ledger.next_nonce(address)
+        return max(nonce,pending+1) if pending is not None else nonce
+
+    def sequenced(self,transactions):       # 按各发送方的下一个 nonce 筛选: 已用过的丢弃, 不连续的放回交易池
+        expected = {}
+        kept = []
+        for transaction in transactions:
+            if 'nonce' not in transaction:
+                kept.append(transaction)
+                continue
+            sender,nonce = transaction['sender'],transaction['nonce']
+            next_nonce = expected.get(sender,self.ledger.next_nonce(sender))
+            if nonce == next_nonce:
+                kept.append(transaction)
+                expected[sender] = nonce+1
+            elif nonce > next_nonce:
+                self.mempool.add(transaction)
+        return kept
+
+    def verified_transactions(self,transactions):     # 批量验签, 只保留签名有效的交易
+        if not self.verify_signatures:
+            return list(transactions)
+        return [transaction for transaction,ok in zip(transactions,self.verifier.verify(transactions)) if ok]
+
+    def sync_indexes(self):     # 补齐新区块的索引, 重新打开的链在第一次查询时才补
+        self.ledger.sync(self.chain)
+        self.address_index.sync(self.chain)
+
+    def get_balance(self,address):
+        self.ledger.sync(self.chain)
+        return self.ledger.get_balance(address)
+
+    def get_history(self,address,page=0,page_size=50):    # 分页查询地址的交易记录 [(高度, 序号, 交易)], 最新的在前
+        self.address_index.sync(self.chain)
+        history = []
+        for height,index in self.address_index.history(address,page,page_size):
+            history.append((height,index,self.chain[height].data[index]))
+        return history
+
+    def save_snapshot(self,path):      # 导出当前链尾的余额状态
+        self.ledger.sync(self.chain)
+        save_snapshot(self.ledger,self.chain[-1].hash,path)
+
+    def load_snapshot(self,path):      # 从快照恢复余额, 只重放快照高度之后的区块
+        height,tip_hash,balances,nonces = load_snapshot(path)
+        if height >= len(self.chain) or self.chain[height].hash != tip_hash:
+            raise ValueError("快照与当前链不一致: 高度 %d" % height)
+        ledger = Ledger()
+        ledger.load(balances,height,nonces)
+        if ledger.state_root() != self.chain[height].state_root:      # 快照自带的 sha256 只防损坏, 余额以区块头中的状态根为准
+            raise ValueError("快照余额与区块状态根不一致: 高度 %d" % height)
+        self.ledger = ledger        # 校验通过才替换, 失败时原索引不变
+        self.ledger.sync(self.chain)
+
+    def index_path(self):       # 地址索引与 BlockStore 保存在同一目录
+        path = getattr(self.chain,'path',None)
+        return os.path.join(path,'addresses.idx') if path else None
+
+    def close(self):
+        if self.index_path():
+            self.chain.sync()       # 区块先落盘, 索引不会领先于区块文件
+            self.address_index.sync(self.chain)
+            self.address_index.save(self.index_path())
+            self.chain.close()
+
+    def get_transaction_proof(self,height,index):      # 返回交易及其到区块 Merkle 根的包含证明
+        block = self.chain[height]
+        leaves = [leaf_hash(transaction) for transaction in block.data]
+        return block.data[index], merkle_proof(leaves,index)
+
+    def get_balance_proof(self,address):      # 供轻客户端查询: (链尾高度, 余额, 到链尾区块状态根的证明), 余额为 0 时证明地址不在状态树中
+        self.ledger.sync(self.chain)
+        return (len(self.chain)-1,)+self.ledger.balance_proof(address)
+
+    def rebuild_ledger(self):       # 链被外部修改后重建余额索引
+        self.ledger.rebuild(self.chain)
     
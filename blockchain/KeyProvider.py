@@ -0,0 +1,106 @@
+import collections
+from concurrent.futures import ProcessPoolExecutor
+
+import rsa
+
+
+class RsaKeyProvider:       # 同步生成 RSA 密钥, 与原来的 Wallet 行为一致
+    def __init__(self, bits=512):
+        self.bits = bits
+
+    def new_keys(self):
+        return rsa.newkeys(self.bits)
+
+
+class Ed25519KeyProvider:   # Ed25519 密钥生成比 RSA 快几个数量级, 需要安装 cryptography
+    def __init__(self):
+        from cryptography.hazmat.primitives.asymmetric import ed25519  # noqa: F401  提前检查依赖
+
+    def new_keys(self):
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import ed25519
+        key = ed25519.Ed25519PrivateKey.generate()
+        raw = key.private_bytes(serialization.Encoding.Raw, serialization.PrivateFormat.Raw, serialization.NoEncryption())
+        public = key.public_key().public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+        return EdPublicKey(public), EdPrivateKey(raw)
+
+
+class EdPublicKey:      # 只保存 32 字节原始公钥, 可哈希、可跨进程传递
+    __slots__ = ('ed25519',)
+
+    def __init__(self, raw):
+        self.ed25519 = raw
+
+    def __eq__(self, other):
+        return isinstance(other, EdPublicKey) and other.ed25519 == self.ed25519
+
+    def __hash__(self):
+        return hash(self.ed25519)
+
+    def __repr__(self):
+        return 'EdPublicKey(%s)' % self.ed25519.hex()
+
+    def verify(self, signature, message):
+        from cryptography.exceptions import InvalidSignature
+        from cryptography.hazmat.primitives.asymmetric import ed25519
+        try:
+            ed25519.Ed25519PublicKey.from_public_bytes(self.ed25519).verify(signature, message)
+        except InvalidSignature:
+            return False
+        return True
+
+
+class EdPrivateKey:
+    __slots__ = ('ed25519',)
+
+    def __init__(self, raw):
+        self.ed25519 = raw
+
+    def sign(self, message):
+        from cryptography.hazmat.primitives.asymmetric import ed25519
+        return ed25519.Ed25519PrivateKey.from_private_bytes(self.ed25519).sign(message)
+
+
+class KeyPool:      # 后台进程预先生成密钥, 取用时不阻塞在密钥生成上
+    def __init__(self, provider=None, size=1024, workers=None, batch=64):
+        self.provider = provider or RsaKeyProvider()
+        self.size = size        # 池中保持的密钥数量
+        self.batch = batch      # 每个后台任务生成的密钥数量
+        self.keys = collections.deque()
+        self.pending = collections.deque()
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.refill()
+
+    def refill(self):
+        while len(self.keys) + len(self.pending) * self.batch < self.size:
+            self.pending.append(self.executor.submit(generate_keys, self.provider, self.batch))
+
+    def new_keys(self):
+        while not self.keys:
+            self.keys.extend(self.pending.popleft().result())
+        keys = self.keys.popleft()
+        while self.pending and self.pending[0].done():
+            self.keys.extend(self.pending.popleft().result())
+        self.refill()
+        return keys
+
+    def close(self):
+        for future in self.pending:
+            future.cancel()
+        self.executor.shutdown()
+
+
+def generate_keys(provider, count):
+    return [provider.new_keys() for _ in range(count)]
+
+
+_default_provider = RsaKeyProvider()
+
+
+def default_provider():
+    return _default_provider
+
+
+def set_default_provider(provider):     # 例如在大规模模拟前换成 KeyPool 或 Ed25519KeyProvider
+    global _default_provider
+    _default_provider = provider
@@ -0,0 +1,132 @@
+from StateTree import StateTree, state_key
+
+
+class Ledger:       # 账户余额索引, 随出块增量更新
+    def __init__(self):
+        self.balances = {}          # 地址 -> 余额
+        self.height = -1            # 已索引到的区块高度
+        self.tree = StateTree()     # 余额状态树, 只在需要状态根或证明时才写入
+        self.dirty = set()          # 余额已变化但尚未写入状态树的地址
+        self.nonces = {}            # 发送方 -> 下一笔交易应使用的 nonce, 只统计带 nonce 的交易
+
+    def apply_block(self, block):
+        self.apply_changes(balance_changes(block.data))
+        for transaction in transactions_of(block):
+            if 'nonce' in transaction:
+                self.nonces[transaction['sender']] = transaction['nonce'] + 1
+        self.height += 1
+
+    def revert_block(self, block):      # 撤销链尾区块: 余额变化可逆, 区块本身即撤销数据
+        self.apply_changes(balance_changes(block.data), -1)
+        for transaction in reversed(list(transactions_of(block))):     # nonce 连续, 撤销后回到该交易的 nonce
+            if 'nonce' in transaction:
+                if transaction['nonce']:
+                    self.nonces[transaction['sender']] = transaction['nonce']
+                else:
+                    self.nonces.pop(transaction['sender'], None)
+        self.height -= 1
+
+    def next_nonce(self, address):
+        return self.nonces.get(address, 0)
+
+    def check_nonces(self, block):      # 带 nonce 的交易必须从各发送方的下一个 nonce 开始连续, 已用过的 nonce 即重放
+        expected = {}
+        for transaction in transactions_of(block):
+            if 'nonce' not in transaction:
+                continue
+            sender = transaction['sender']
+            if transaction['nonce'] != expected.get(sender, self.next_nonce(sender)):
+                return False
+            expected[sender] = transaction['nonce'] + 1
+        return True
+
+    def apply_changes(self, changes, sign=1):
+        for address, change in changes.items():
+            self.balances[address] = self.balances.get(address, 0) + change * sign
+        self.dirty.update(changes)
+
+    def sync(self, chain):      # 只索引尚未处理的新区块, 重新打开的链在第一次查询时才补索引
+        for height in range(self.height + 1, len(chain)):
+            self.apply_block(chain[height])
+
+    def rebuild(self, chain):       # 从链上重建索引
+        self.load({}, -1)
+        for block in chain:
+            self.apply_block(block)
+
+    def load(self, balances, height, nonces=None):   # 直接设置余额 (例如来自快照), 状态树在下次取根时重建
+        self.balances = balances
+        self.nonces = nonces if nonces is not None else {}
+        self.height = height
+        self.tree = StateTree()
+        self.dirty = set(balances)
+
+    def get_balance(self, address):
+        return self.balances.get(address, 0)
+
+    def update_tree(self):      # 把变化过的余额写入状态树, O(变化的地址数 * 树高)
+        if self.tree.root is None:      # 空树 (重建或载入快照后) 一次性建树
+            self.tree.load((state_key(address), self.balances[address]) for address in self.balances)
+            self.dirty.clear()
+            return
+        for address in self.dirty:
+            self.tree.set(state_key(address), self.balances.get(address, 0))
+        self.dirty.clear()
+
+    def state_root(self, data=None):    # 当前状态根; 给出区块数据时返回应用该区块之后的状态根, 余额本身不变
+        self.update_tree()
+        if not data:
+            return self.tree.root_hash()
+        changes = balance_changes(data)
+        for address, change in changes.items():
+            self.tree.set(state_key(address), self.balances.get(address, 0) + change)
+        root = self.tree.root_hash()
+        self.dirty.update(changes)      # 树中暂存的是预览余额, 下次取根时改回实际余额
+        return root
+
+    def balance_proof(self, address):       # (余额, 到当前状态根的证明), 不在树中的地址证明其余额为 0
+        self.update_tree()
+        return self.tree.prove(state_key(address))
+
+
+def balance_changes(data):      # 区块数据对余额的影响 {地址: 变化量}
+    # 发送方付出金额和手续费, 本块手续费合计记给矿工; 没有矿工记录的区块手续费直接销毁
+    changes = {}
+    if not isinstance(data, list):
+        return changes
+    fees = 0
+    miner = None
+    for transaction in data:
+        if not isinstance(transaction, dict):
+            continue
+        if 'sender' in transaction and 'recipient' in transaction:
+            amount = transaction['amount']
+            fee = transaction.get('fee', 0)
+            changes[transaction['recipient']] = changes.get(transaction['recipient'], 0) + amount
+            changes[transaction['sender']] = changes.get(transaction['sender'], 0) - amount - fee
+            fees += fee
+        elif 'miner' in transaction:
+            miner = transaction['miner']
+    if fees and miner is not None:
+        changes[miner] = changes.get(miner, 0) + fees
+    return changes
+
+
+def transactions_of(block):     # 只取区块中的转账交易, 跳过创世数据和出块奖励
+    for _, transaction in indexed_transactions(block):
+        yield transaction
+
+
+def indexed_transactions(block):    # (交易在 block.data 中的序号, 交易)
+    if not isinstance(block.data, list):
+        return
+    for index, transaction in enumerate(block.data):
+        if isinstance(transaction, dict) and 'sender' in transaction and 'recipient' in transaction:
+            yield index, transaction
+
+
+def scan_balance(chain, address):   # 全链扫描计算余额
+    balance = 0
+    for block in chain:
+        balance += balance_changes(block.data).get(address, 0)
+    return balance
@@ -0,0 +1,97 @@
+import asyncio
+import hashlib
+
+from Block import HEADER, header_difficulty, header_previous, header_state_root
+from Codec import decode, encode
+from Mining import target
+from Node import FRAME
+from StateTree import verify_balance
+
+
+class LightClient:      # 轻客户端: 只保存定长区块头, 依靠区块头中的状态根验证全节点返回的余额
+    def __init__(self,genesis_hash,min_difficulty):
+        self.genesis = bytes.fromhex(genesis_hash)     # 信任的创世区块 hash, 第一个区块头必须与之一致
+        self.min_difficulty = min_difficulty    # 之后的区块头至少要有这个难度, 难度 0 的伪造区块头不被接受
+        self.headers = bytearray()      # 区块头依次拼接, 高度 i 位于 i*HEADER.size
+        self.tip = bytes(32)            # 链尾区块 hash
+        self.reader = None
+        self.writer = None
+
+    def __len__(self):
+        return len(self.headers) // HEADER.size
+
+    def header(self,height=-1):
+        if height < 0:
+            height += len(self)
+        if not 0 <= height < len(self):
+            raise IndexError("区块头高度超出范围: %d" % height)
+        return bytes(self.headers[height*HEADER.size:(height+1)*HEADER.size])
+
+    def state_root(self,height=-1):
+        return header_state_root(self.header(height))
+
+    def memory(self):       # 区块头占用的字节数
+        return len(self.headers)
+
+    def add_headers(self,headers):      # 校验创世区块、链接、难度下限和工作量, 整批通过后才追加
+        batch = bytearray()
+        previous = self.tip
+        for header in headers:
+            height = len(self)+len(batch)//HEADER.size
+            digest = hashlib.sha256(header).digest()
+            if len(header) != HEADER.size or header_previous(header) != previous:
+                raise ValueError("无效区块头: 高度 %d" % height)
+            if height == 0:
+                valid = digest == self.genesis
+            else:
+                valid = header_difficulty(header) >= self.min_difficulty and int.from_bytes(digest,'big') < target(header_difficulty(header))
+            if not valid:
+                raise ValueError("无效区块头: 高度 %d" % height)
+            batch += header
+            previous = digest
+        self.headers += batch
+        self.tip = previous
+        return len(batch) // HEADER.size
+
+    def sync_from(self,chain):      # 同一进程中直接从全节点的链读取新区块头
+        return self.add_headers(block.header for block in chain[len(self):])
+
+    def verify_balance(self,address,balance,proof,height=-1):      # 余额为 0 时 proof 证明地址不在状态树中
+        return verify_balance(self.state_root(height),address,balance,proof)
+
+    async def connect(self,host,port):      # 连接全节点, 使用与 Node 相同的消息帧
+        self.reader,self.writer = await asyncio.open_connection(host,port)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+    async def request(self,reply,*message):     # 发送请求并等待指定类型的响应, 忽略对端的其他消息
+        frame = encode(list(message))
+        self.writer.write(FRAME.pack(len(frame))+frame)
+        await self.writer.drain()
+        while True:
+            size = FRAME.unpack(await self.reader.readexactly(FRAME.size))[0]
+            response = decode(await self.reader.readexactly(size))
+            if response[0] == reply:
+                return response
+
+    async def sync(self,batch=2000):        # 按批下载新区块头, 返回追加的数量
+        added = 0
+        while True:
+            headers = (await self.request('headers','getheaders',len(self),batch))[2]
+            if not headers:
+                return added
+            added += self.add_headers(headers)
+
+    async def get_balance(self,address):
+        # 查询余额并用本地区块头的状态根验证, 余额为 0 时验证地址不在状态树中; 证明无效或不是最新状态时抛出 ValueError
+        _,_,height,balance,proof = await self.request('proof','getproof',address)
+        if height >= len(self):
+            await self.sync()
+        if not len(self)-1 <= height < len(self):    # 全节点落后于本地区块头时可能返回旧余额
+            raise ValueError("余额证明的高度 %s 与本地链尾 %d 不一致: %s" % (height,len(self)-1,address))
+        if not self.verify_balance(address,balance,proof,height):
+            raise ValueError("余额证明无效: %s" % address)
+        return balance
@@ -0,0 +1,115 @@
+import heapq
+import itertools
+from bisect import bisect_left, insort
+
+from Codec import encode_transaction
+from Transaction import transaction_id
+
+
+class Mempool:      # 待打包交易池: 按手续费率排序, 交易 id 去重, 同一发送方按 nonce 顺序, 总字节数有上限
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.entries = {}       # 交易 id -> Entry
+        self.by_sender = {}     # 发送方 -> [(nonce, 序号, 交易 id)], 按 nonce 排序
+        self.ready = []         # 各发送方队首交易的最大堆 (-费率, 序号, 交易 id), 惰性删除
+        self.lowest = []        # 全部交易的最小堆 (费率, -序号, 交易 id), 用于淘汰, 惰性删除
+        self.counter = itertools.count()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, txid):
+        return txid in self.entries
+
+    def transactions(self):     # 按进入顺序返回全部交易
+        return [entry.transaction for entry in sorted(self.entries.values(), key=lambda entry: entry.seq)]
+
+    def add(self, transaction):     # 返回交易 id, 重复或因容量不足被淘汰时返回 None
+        txid = transaction_id(transaction)
+        if txid in self.entries:
+            return None
+        seq = next(self.counter)
+        nonce = transaction.get('nonce', seq)   # 没有 nonce 的交易按进入顺序排队
+        queue = self.by_sender.setdefault(transaction['sender'], [])
+        i = bisect_left(queue, (nonce,))
+        if i < len(queue) and queue[i][0] == nonce:
+            return None
+        entry = Entry(transaction, txid, seq, nonce, len(encode_transaction(transaction)))
+        self.entries[txid] = entry
+        self.total_bytes += entry.size
+        insort(queue, (nonce, seq, txid))
+        heapq.heappush(self.lowest, (entry.feerate, -seq, txid))
+        if len(self.lowest) > 2 * len(self.entries) + 1024:    # 清理惰性删除留下的堆项
+            self.lowest = [item for item in self.lowest if item[2] in self.entries]
+            heapq.heapify(self.lowest)
+        if queue[0][2] == txid:
+            heapq.heappush(self.ready, (-entry.feerate, seq, txid))
+        while self.total_bytes > self.max_bytes:
+            self.evict()
+        return txid if txid in self.entries else None
+
+    def pending_nonce(self, sender):       # 发送方在池中排队的最大 nonce, 没有时为 None
+        queue = self.by_sender.get(sender)
+        return queue[-1][0] if queue else None
+
+    def evict(self):    # 淘汰费率最低的交易, 同一发送方 nonce 更大的交易无法再打包, 一并淘汰
+        while self.lowest:
+            txid = heapq.heappop(self.lowest)[2]
+            entry = self.entries.get(txid)
+            if entry is None:
+                continue
+            queue = self.by_sender[entry.transaction['sender']]
+            for queued in [queued for queued in queue if queued[0] >= entry.nonce]:
+                self.remove(queued[2])
+            return
+
+    def remove(self, txid):
+        entry = self.entries.pop(txid, None)
+        if entry is None:
+            return
+        self.total_bytes -= entry.size
+        sender = entry.transaction['sender']
+        queue = self.by_sender[sender]
+        was_head = queue[0][2] == txid
+        queue.remove((entry.nonce, entry.seq, txid))
+        if not queue:
+            del self.by_sender[sender]
+        elif was_head:
+            self.push_head(sender)
+
+    def push_head(self, sender):
+        txid = self.by_sender[sender][0][2]
+        entry = self.entries[txid]
+        heapq.heappush(self.ready, (-entry.feerate, entry.seq, txid))
+
+    def pop_best(self, max_bytes=None):     # 取出不超过 max_bytes 的最高费率交易子集, O(k log n)
+        selected = []
+        skipped = []
+        space = max_bytes if max_bytes is not None else self.total_bytes
+        while self.ready and space > 0:
+            item = heapq.heappop(self.ready)
+            entry = self.entries.get(item[2])
+            if entry is None or self.by_sender[entry.transaction['sender']][0][2] != entry.txid:
+                continue
+            if entry.size > space:      # 放不下则该发送方本块不再打包, 保证 nonce 顺序
+                skipped.append(item)
+                continue
+            space -= entry.size
+            selected.append(entry.transaction)
+            self.remove(entry.txid)
+        for item in skipped:
+            heapq.heappush(self.ready, item)
+        return selected
+
+
+class Entry:
+    __slots__ = ('transaction', 'txid', 'seq', 'nonce', 'size', 'feerate')
+
+    def __init__(self, transaction, txid, seq, nonce, size):
+        self.transaction = transaction
+        self.txid = txid
+        self.seq = seq
+        self.nonce = nonce
+        self.size = size
+        self.feerate = transaction.get('fee', 0) / size      # 每字节手续费
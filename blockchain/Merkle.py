@@ -0,0 +1,66 @@
+import hashlib
+
+from Codec import encode_transaction
+
+# Merkle 树: 叶子为交易规范编码的 sha256, 奇数层的最后一个节点直接升到上一层
+# 不复制最后一个节点, 否则 [t0,t1,t2] 与 [t0,t1,t2,t2] 的根相同 (CVE-2012-2459)
+# 证明为 [(兄弟节点 hash, 兄弟是否在左边), ...], 长度 O(log n)
+# 状态树见 StateTree.py, 与这里共用内部节点的 node_hash
+
+
+def leaf_hash(transaction):
+    return hashlib.sha256(b'\x00' + encode_transaction(transaction)).digest()
+
+
+def node_hash(left, right):
+    return hashlib.sha256(b'\x01' + left + right).digest()
+
+
+def merkle_root(leaves):
+    if not leaves:
+        return bytes(32)
+    level = list(leaves)
+    while len(level) > 1:
+        level = next_level(level)
+    return level[0]
+
+
+def next_level(level):
+    parents = [node_hash(level[i], level[i+1]) for i in range(0, len(level) - 1, 2)]
+    if len(level) % 2:
+        parents.append(level[-1])
+    return parents
+
+
+def merkle_proof(leaves, index):
+    return tree_proof(merkle_tree(leaves), index)
+
+
+def merkle_tree(leaves):    # 根以下的所有层, 同一棵树的多次证明可复用
+    levels = []
+    level = list(leaves)
+    while len(level) > 1:
+        levels.append(level)
+        level = next_level(level)
+    return levels
+
+
+def tree_proof(levels, index):
+    proof = []
+    for level in levels:
+        sibling = index ^ 1
+        if sibling < len(level):    # 升上去的节点在这一层没有兄弟
+            proof.append((level[sibling], sibling < index))
+        index //= 2
+    return proof
+
+
+def verify_proof(leaf, proof, root):
+    node = leaf
+    for sibling, sibling_is_left in proof:
+        node = node_hash(sibling, node) if sibling_is_left else node_hash(node, sibling)
+    return node == root
+
+
+def verify_transaction(transaction, proof, root):     # 轻客户端只需区块头中的 Merkle 根即可验证一笔交易
+    return verify_proof(leaf_hash(transaction), proof, root)
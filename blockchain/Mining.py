@@ -0,0 +1,68 @@
+import hashlib
+import multiprocessing
+import struct
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import Stats
+
+NONCE = struct.Struct('>Q')
+CHECK_EVERY = 4096      # 每尝试多少个 nonce 检查一次取消标志
+
+_cancel = None      # 进程池内共享的取消标志
+
+
+def target(difficulty):     # hash 视为 256 位整数, 小于目标值即满足难度 (difficulty 为前导 0 位数)
+    return 1 << (256 - difficulty)
+
+
+def search(prefix, difficulty, start=0, step=1, limit=None):
+    # 在 start, start+step, ... 中寻找 nonce; 区块头前缀只哈希一次, 每次尝试复制哈希状态
+    # 返回 (nonce 或 None, 尝试次数), 次数只在每批结束或找到时累计, 循环内没有额外开销
+    base = hashlib.sha256(prefix)
+    goal = target(difficulty)
+    pack = NONCE.pack
+    nonce = start
+    attempts = 0
+    while limit is None or attempts < limit:
+        first = nonce
+        for nonce in range(first, first + CHECK_EVERY * step, step):
+            h = base.copy()
+            h.update(pack(nonce))
+            if int.from_bytes(h.digest(), 'big') < goal:
+                return nonce, attempts + (nonce - first) // step + 1
+        nonce += step
+        attempts += CHECK_EVERY
+        if _cancel is not None and _cancel.is_set():
+            break
+    return None, attempts
+
+
+def mine(prefix, difficulty, workers=1, limit=None):
+    # 多进程按步长划分 nonce 空间, 任一进程找到解后通知其他进程提前退出
+    start = time.perf_counter()
+    if workers <= 1:
+        nonce, attempts = search(prefix, difficulty, limit=limit)
+    else:
+        nonce = None
+        cancel = multiprocessing.Event()
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(cancel,)) as executor:
+            futures = [executor.submit(search, prefix, difficulty, i, workers, limit) for i in range(workers)]
+            pending = set(futures)
+            while pending and nonce is None:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.result()[0] is not None:
+                        cancel.set()
+                        nonce = future.result()[0]
+                        break
+        attempts = sum(future.result()[1] for future in futures)    # 离开 with 时各进程都已退出
+    if Stats.enabled():     # 每次挖矿只上报一次: 尝试次数 / 搜索耗时 即哈希率
+        Stats.increment('mine_attempts', attempts)
+        Stats.observe('nonce_search', time.perf_counter() - start)
+    return nonce
+
+
+def init_worker(cancel):
+    global _cancel
+    _cancel = cancel
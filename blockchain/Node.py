@@ -0,0 +1,262 @@
+import asyncio
+import hashlib
+import struct
+
+from Block import Block, header_difficulty, header_previous
+from Codec import decode, encode
+from Ledger import transactions_of
+from Mining import target
+from Transaction import transaction_id
+
+FRAME = struct.Struct('>I')     # 消息帧: 4 字节长度 + 规范编码的 [类型, 参数...]
+
+
+class Node:     # 基于 asyncio 的 P2P 节点, 通过 TCP 在节点间传播区块和交易
+    def __init__(self,cryptocurrency,host='127.0.0.1',port=0,header_batch=2000,block_batch=200,window=8,outbox_size=256):
+        self.cryptocurrency = cryptocurrency
+        self.host = host
+        self.port = port
+        self.header_batch = header_batch    # 每个 getheaders 请求的区块头数量
+        self.block_batch = block_batch      # 每个 getblocks 请求的区块数量
+        self.window = window                # 同步时同时在途的请求数
+        self.outbox_size = outbox_size      # 每个连接的发送队列长度, 满了以后广播消息直接丢弃
+        self.peers = []
+        self.server = None
+        self.syncing = False
+        self.seen = set()       # 已处理过的区块 hash 和交易 id, 避免重复广播
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.accept,self.host,self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        for peer in list(self.peers):
+            peer.close()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def accept(self,reader,writer):
+        self.add_peer(reader,writer)
+
+    async def connect(self,host,port):
+        reader,writer = await asyncio.open_connection(host,port)
+        return self.add_peer(reader,writer)
+
+    def add_peer(self,reader,writer):
+        peer = Peer(self,reader,writer)
+        self.peers.append(peer)
+        peer.start()
+        peer.post('hello',len(self.cryptocurrency.chain))
+        return peer
+
+    def drop(self,peer):
+        if peer in self.peers:
+            self.peers.remove(peer)
+
+    def height(self):
+        return len(self.cryptocurrency.chain)
+
+    def hash_at(self,height):      # BlockStore 直接从索引取 hash, 不解码区块
+        chain = self.cryptocurrency.chain
+        return chain.hash_at(height) if hasattr(chain,'hash_at') else chain[height].hash
+
+    def locator(self):      # 本地链上的 [高度, hash]: 最近 10 个逐个, 之后间隔翻倍直到创世区块
+        locator = []
+        height = self.height()-1
+        step = 1
+        while height > 0:
+            locator.append([height,self.hash_at(height)])
+            if len(locator) >= 10:
+                step *= 2
+            height -= step
+        if self.height():
+            locator.append([0,self.hash_at(0)])
+        return locator
+
+    def fork_height(self,locator):     # locator 中第一个与本地链相同的区块高度, 都不相同时为 -1
+        for height,block_hash in locator:
+            if 0 <= height < self.height() and self.hash_at(height) == block_hash:
+                return height
+        return -1
+
+    async def dispatch(self,peer,message):
+        kind = message[0]
+        if kind == 'hello':
+            peer.height = message[1]
+            self.maybe_sync(peer)
+        elif kind == 'locate':        # 同步前先找分叉点
+            await peer.send('located',self.fork_height(message[1]))
+        elif kind == 'getheaders':
+            start,count = message[1],message[2]
+            chain = self.cryptocurrency.chain
+            headers = [block.header for block in chain[start:start+count]]
+            await peer.send('headers',start,headers)
+        elif kind == 'getblocks':
+            start,count = message[1],message[2]
+            records = [block.to_record() for block in self.cryptocurrency.chain[start:start+count]]
+            await peer.send('blocks',start,records)
+        elif kind == 'getproof':      # 轻客户端查询余额: 返回余额及其到链尾状态根的证明
+            address = message[1]
+            height,balance,proof = self.cryptocurrency.get_balance_proof(address)
+            await peer.send('proof',address,height,balance,proof)
+        elif kind in ('located','headers','blocks'):
+            await peer.responses.put(message)
+        elif kind == 'block':
+            self.receive_block(peer,message[1],Block.from_record(message[2]))
+        elif kind == 'tx':
+            self.receive_transaction(peer,message[1])
+
+    def maybe_sync(self,peer):
+        if peer.height > self.height() and not self.syncing:
+            asyncio.ensure_future(self.sync(peer))
+
+    async def sync(self,peer):
+        # 先用 locator 找到与对端的分叉点, 同步分叉点之后的区块头并校验链接和工作量, 再流水线下载区块体;
+        # 区块按接收广播的流程加入, 对端分支工作量更大时切换过去
+        self.syncing = True
+        try:
+            while peer.height > self.height():
+                await peer.send('locate',self.locator())
+                fork = (await peer.responses.get())[1]
+                if fork < 0 and self.height():
+                    raise ConnectionError("对端创世区块不同")
+                headers = await self.fetch_headers(peer,fork)
+                if not headers:
+                    break
+                tip = self.hash_at(-1) if self.height() else None
+                await self.fetch_blocks(peer,fork+1,headers)
+                if self.hash_at(-1) == tip:     # 对端分支工作量不够, 不再重复请求
+                    break
+        except (ConnectionError,ValueError):    # 对端数据无效, 断开连接
+            peer.close()
+        finally:
+            self.syncing = False
+
+    async def fetch_headers(self,peer,fork):
+        previous = bytes.fromhex(self.hash_at(fork)) if fork >= 0 else bytes(32)
+        headers = []
+        async for _,batch in self.pipeline(peer,'getheaders',fork+1,peer.height,self.header_batch):
+            for header in batch:
+                digest = hashlib.sha256(header).digest()
+                if header_previous(header) != previous or int.from_bytes(digest,'big') >= target(header_difficulty(header)):
+                    raise ConnectionError("对端区块头无效")
+                headers.append(digest)
+                previous = digest
+        return headers
+
+    async def fetch_blocks(self,peer,start,headers):
+        async for offset,records in self.pipeline(peer,'getblocks',start,start+len(headers),self.block_batch):
+            for i,record in enumerate(records):
+                block = Block.from_record(record)
+                if bytes.fromhex(block.hash) != headers[offset-start+i]:
+                    raise ConnectionError("区块与区块头不一致")
+                self.cryptocurrency.receive_block(block)     # 同步期间已经通过广播收到的区块返回 'known'
+                self.seen.add(block.hash)
+
+    async def pipeline(self,peer,request,start,stop,batch):
+        # 保持 window 个请求在途; 同一连接上的响应按请求顺序返回
+        next_start = start
+        in_flight = 0
+        while next_start < stop or in_flight:
+            while in_flight < self.window and next_start < stop:
+                await peer.send(request,next_start,min(batch,stop-next_start))
+                next_start += batch
+                in_flight += 1
+            message = await peer.responses.get()
+            in_flight -= 1
+            yield message[1],message[2]
+
+    def receive_block(self,peer,height,block):
+        peer.height = max(peer.height,height+1)
+        if block.hash in self.seen:
+            return
+        try:
+            self.cryptocurrency.receive_block(block)    # 延长链尾、记为分叉或触发切换
+        except ValueError:      # 父区块未知说明落后较多, 走区块头同步
+            self.maybe_sync(peer)
+            return
+        self.seen.add(block.hash)
+        self.broadcast('block',height,block.to_record(),exclude=peer)
+
+    def receive_transaction(self,peer,transaction):
+        txid = self.cryptocurrency.accept_transaction(transaction)
+        if txid is not None:
+            self.broadcast('tx',transaction,exclude=peer)
+
+    def broadcast(self,*message,exclude=None):
+        for peer in self.peers:
+            if peer is not exclude:
+                peer.post(*message)
+
+    async def mine_block(self,miner_address):
+        # 在事件循环中按当前链尾生成模板, 只把工作量证明放到线程中计算;
+        # 挖矿期间可能收到别的区块, 算完后按接收区块的流程加入, 链尾已变化时新区块成为分叉
+        cryptocurrency = self.cryptocurrency
+        height = self.height()
+        transactions,previous_hash,state_root = cryptocurrency.block_template(miner_address)
+        loop = asyncio.get_running_loop()
+        block = await loop.run_in_executor(None,Block,transactions,previous_hash,cryptocurrency.difficulty,
+                                           cryptocurrency.mining_workers,state_root)
+        self.seen.add(block.hash)
+        if cryptocurrency.receive_block(block) == 'side':
+            # 没有上链的交易回到交易池, 期间新上链的区块中已有的除外
+            included = {transaction_id(transaction) for mined in cryptocurrency.chain[height:] for transaction in transactions_of(mined)}
+            for transaction in transactions_of(block):
+                if transaction_id(transaction) not in included:
+                    cryptocurrency.accept_transaction(transaction)
+        self.broadcast('block',height,block.to_record())
+        return block
+
+    def submit_transaction(self,transaction):
+        if self.cryptocurrency.accept_transaction(transaction) is not None:
+            self.broadcast('tx',transaction)
+
+
+class Peer:
+    def __init__(self,node,reader,writer):
+        self.node = node
+        self.reader = reader
+        self.writer = writer
+        self.height = 0
+        self.responses = asyncio.Queue()
+        self.outbox = asyncio.Queue(maxsize=node.outbox_size)
+        self.tasks = []
+
+    def start(self):
+        self.tasks = [asyncio.ensure_future(self.read_loop()),asyncio.ensure_future(self.write_loop())]
+
+    async def send(self,*message):      # 请求和响应: 发送队列满时等待, 形成背压
+        await self.outbox.put(encode(list(message)))
+
+    def post(self,*message):        # 广播: 尽力而为, 队列满时丢弃, 对端之后会通过同步补齐
+        try:
+            self.outbox.put_nowait(encode(list(message)))
+        except asyncio.QueueFull:
+            pass
+
+    async def write_loop(self):
+        try:
+            while True:
+                frame = await self.outbox.get()
+                self.writer.write(FRAME.pack(len(frame))+frame)
+                await self.writer.drain()
+        except ConnectionError:
+            self.close()
+
+    async def read_loop(self):
+        try:
+            while True:
+                size = FRAME.unpack(await self.reader.readexactly(FRAME.size))[0]
+                await self.node.dispatch(self,decode(await self.reader.readexactly(size)))
+        except (asyncio.IncompleteReadError,ConnectionError,ValueError):
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        self.node.drop(self)
+        for task in self.tasks:
+            if task is not asyncio.current_task():
+                task.cancel()
+        self.writer.close()
@@ -0,0 +1,53 @@
+import hashlib
+import os
+import struct
+
+from Codec import INT64, _decode, encode
+
+# 状态快照: 魔数 + 高度 + 该高度区块 hash + 余额表 + nonce 表, 末尾 32 字节为前面全部内容的 sha256
+MAGIC = b'SNAP2'
+HEADER = struct.Struct('>5sQ32sI')
+COUNT = struct.Struct('>I')
+
+
+def save_snapshot(ledger, tip_hash, path):
+    parts = [HEADER.pack(MAGIC, ledger.height, bytes.fromhex(tip_hash), len(ledger.balances))]
+    for address, balance in ledger.balances.items():
+        parts.append(encode(address))
+        parts.append(INT64.pack(balance))
+    parts.append(COUNT.pack(len(ledger.nonces)))
+    for address, nonce in ledger.nonces.items():
+        parts.append(encode(address))
+        parts.append(INT64.pack(nonce))
+    body = b''.join(parts)
+    with open(path + '.tmp', 'wb') as f:
+        f.write(body)
+        f.write(hashlib.sha256(body).digest())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + '.tmp', path)
+
+
+def load_snapshot(path):    # 返回 (高度, 区块 hash, 余额表, nonce 表), 校验失败抛出 ValueError
+    with open(path, 'rb') as f:
+        raw = f.read()
+    body, digest = raw[:-32], raw[-32:]
+    if len(raw) < HEADER.size + 32 or hashlib.sha256(body).digest() != digest:
+        raise ValueError("快照校验失败: %s" % path)
+    magic, height, tip, count = HEADER.unpack_from(body)
+    if magic != MAGIC:
+        raise ValueError("不是快照文件: %s" % path)
+    buf = memoryview(body)
+    pos = HEADER.size
+    balances, pos = read_table(buf, pos, count)
+    nonces, pos = read_table(buf, pos + COUNT.size, COUNT.unpack_from(buf, pos)[0])
+    return height, tip.hex(), balances, nonces
+
+
+def read_table(buf, pos, count):    # count 个 (地址, 8 字节整数)
+    table = {}
+    for _ in range(count):
+        address, pos = _decode(buf, pos)
+        table[address] = INT64.unpack_from(buf, pos)[0]
+        pos += INT64.size
+    return table, pos
@@ -0,0 +1,163 @@
+import hashlib
+from bisect import bisect_left
+
+from Codec import encode
+from Merkle import node_hash
+
+# 余额状态树: 以 sha256(地址编码) 作为 256 位路径的稀疏 Merkle 树, 只存余额非 0 的地址
+# 空子树的 hash 为 32 字节 0, 只含一个叶子的子树直接用该叶子的 hash, 树高约为 log2(地址数)
+# 叶子 = sha256(0x02 + 路径 + 余额编码), 内部节点 = sha256(0x01 + 左 + 右)
+# 同一组余额无论更新顺序如何都得到同一棵树; 更新一个地址只重算从叶子到根路径上的节点
+# 证明为 [兄弟节点 hash 列表(从根往下), 路径终点的其他叶子 (路径, 余额) 或 None], 同时可以证明地址不存在
+
+EMPTY = bytes(32)
+BITS = 256
+
+
+def state_key(address):
+    return hashlib.sha256(encode(address)).digest()
+
+
+def leaf_hash(key, balance):
+    return hashlib.sha256(b'\x02' + key + encode(balance)).digest()
+
+
+def bit(path, depth):
+    return path >> (BITS - 1 - depth) & 1
+
+
+class Leaf:
+    __slots__ = ('path', 'balance', 'hash')
+
+    def __init__(self, key, balance):
+        self.path = int.from_bytes(key, 'big')
+        self.balance = balance
+        self.hash = leaf_hash(key, balance)
+
+
+class Inner:
+    __slots__ = ('left', 'right', 'hash')
+
+    def __init__(self, left=None, right=None):
+        self.left = left
+        self.right = right
+        self.hash = None        # None 表示子树有改动, 下次取根时重新计算
+
+
+class StateTree:
+    def __init__(self):
+        self.root = None
+
+    def load(self, items):      # 由 (路径, 余额) 一次性建树, 比逐个 set 少了每次从根往下的查找
+        leaves = sorted((Leaf(key, balance) for key, balance in items if balance), key=lambda leaf: leaf.path)
+        self.root = build(leaves, [leaf.path for leaf in leaves], 0, len(leaves), 0)
+
+    def set(self, key, balance):    # 余额为 0 时删除该地址
+        if balance:
+            self.root = insert(self.root, Leaf(key, balance), 0)
+        else:
+            self.root = remove(self.root, int.from_bytes(key, 'big'), 0)
+
+    def root_hash(self):
+        return subtree_hash(self.root)
+
+    def prove(self, key):       # 返回 (余额, 证明), 地址不在树中时余额为 0
+        path = int.from_bytes(key, 'big')
+        siblings = []
+        node = self.root
+        depth = 0
+        while type(node) is Inner:
+            if bit(path, depth):
+                siblings.append(subtree_hash(node.left))
+                node = node.right
+            else:
+                siblings.append(subtree_hash(node.right))
+                node = node.left
+            depth += 1
+        if node is None:
+            return 0, [siblings, None]
+        if node.path == path:
+            return node.balance, [siblings, None]
+        return 0, [siblings, [node.path.to_bytes(32, 'big'), node.balance]]
+
+
+def build(leaves, paths, lo, hi, depth):     # leaves[lo:hi] 按路径排序且在 depth 之前的前缀相同
+    if hi - lo <= 1:
+        return leaves[lo] if hi > lo else None
+    prefix = paths[lo] >> (BITS - depth) << (BITS - depth)
+    middle = bisect_left(paths, prefix | 1 << (BITS - 1 - depth), lo, hi)
+    if middle in (lo, hi):      # 全部在同一侧, 本层只有一个孩子
+        child = build(leaves, paths, lo, hi, depth + 1)
+        return Inner(None, child) if middle == lo else Inner(child, None)
+    return Inner(build(leaves, paths, lo, middle, depth + 1), build(leaves, paths, middle, hi, depth + 1))
+
+
+def insert(node, leaf, depth):
+    if node is None:
+        return leaf
+    if type(node) is Leaf:
+        if node.path == leaf.path:
+            return leaf
+        return split(node, leaf, depth)
+    node.hash = None
+    if bit(leaf.path, depth):
+        node.right = insert(node.right, leaf, depth + 1)
+    else:
+        node.left = insert(node.left, leaf, depth + 1)
+    return node
+
+
+def split(a, b, depth):     # 两个叶子从 depth 开始的最短公共前缀下分开
+    if bit(a.path, depth) == bit(b.path, depth):
+        child = split(a, b, depth + 1)
+        return Inner(None, child) if bit(a.path, depth) else Inner(child, None)
+    return Inner(b, a) if bit(a.path, depth) else Inner(a, b)
+
+
+def remove(node, path, depth):
+    if node is None:
+        return None
+    if type(node) is Leaf:
+        return None if node.path == path else node
+    if bit(path, depth):
+        node.right = remove(node.right, path, depth + 1)
+    else:
+        node.left = remove(node.left, path, depth + 1)
+    left, right = node.left, node.right
+    if left is None and (right is None or type(right) is Leaf):     # 只剩一个叶子时收缩为该叶子
+        return right
+    if right is None and type(left) is Leaf:
+        return left
+    node.hash = None
+    return node
+
+
+def subtree_hash(node):
+    if node is None:
+        return EMPTY
+    if node.hash is None:
+        node.hash = node_hash(subtree_hash(node.left), subtree_hash(node.right))
+    return node.hash
+
+
+def verify_balance(root, address, balance, proof):      # 验证 address 在状态根 root 下的余额为 balance (可以为 0)
+    siblings, other = proof
+    if len(siblings) > BITS:
+        return False
+    key = state_key(address)
+    path = int.from_bytes(key, 'big')
+    if other is None:
+        node = leaf_hash(key, balance) if balance else EMPTY
+    else:       # 路径终点是另一个地址的叶子, 证明 address 不存在
+        other_key, other_balance = other
+        if balance or not other_balance or len(other_key) != 32 or other_key == key:
+            return False
+        if (int.from_bytes(other_key, 'big') ^ path) >> (BITS - len(siblings)):     # 两个路径的前缀必须相同
+            return False
+        node = leaf_hash(other_key, other_balance)
+    for depth in range(len(siblings) - 1, -1, -1):
+        if bit(path, depth):
+            node = node_hash(siblings[depth], node)
+        else:
+            node = node_hash(node, siblings[depth])
+    return node == root
@@ -0,0 +1,120 @@
+import functools
+import importlib
+import time
+from bisect import bisect_left
+
+# 可选的性能统计: enable() 时给热点方法套上计时包装, disable() 时换回原方法, 关闭时没有任何额外开销
+TARGETS = [     # (模块, 类, 方法, 指标名)
+    ('Block', 'Block', 'calculate_hash', 'hash'),
+    ('CompactBlock', 'CompactBlock', 'calculate_digest', 'hash'),
+    ('Blockchain', 'Blockchain', 'validate_chain', 'validate'),
+    ('Cryptocurrency', 'Cryptocurrency', 'check_block', 'validate'),
+    ('Cryptocurrency', 'Cryptocurrency', 'extend', 'import'),
+    ('Cryptocurrency', 'Cryptocurrency', 'mine_block', 'mine'),
+    ('Cryptocurrency', 'Cryptocurrency', 'get_balance', 'balance'),     # 只计余额索引这一层, Wallet.get_balance 调用它时不重复计数
+]
+BUCKETS = (1e-6, 1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1.0, 10.0)     # 直方图上界(秒)
+
+histograms = {}
+counters = {}
+_originals = []
+
+
+class Histogram:
+    __slots__ = ('counts', 'sum', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # 最后一格为 +Inf
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+
+def enabled():
+    return bool(_originals)
+
+
+def enable():
+    if _originals:
+        return
+    for module_name, class_name, method, metric in TARGETS:
+        cls = getattr(importlib.import_module(module_name), class_name)
+        original = cls.__dict__[method]
+        _originals.append((cls, method, original))
+        setattr(cls, method, timed(original, metric, histograms.setdefault(metric, Histogram())))
+
+
+def disable():
+    while _originals:
+        cls, method, original = _originals.pop()
+        setattr(cls, method, original)
+
+
+def reset():
+    histograms.clear()
+    counters.clear()
+    if _originals:      # 已套上的包装引用旧直方图, 重新安装
+        disable()
+        enable()
+
+
+def increment(name, n=1):
+    counters[name] = counters.get(name, 0) + n
+
+
+def observe(name, seconds):     # 不经过方法包装, 由调用方直接记录耗时
+    histograms.setdefault(name, Histogram()).observe(seconds)
+
+
+def timed(func, metric, histogram):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            increment(metric + '_errors')     # 例如校验失败的区块
+            raise
+        finally:
+            histogram.observe(time.perf_counter() - start)
+    return wrapper
+
+
+def snapshot():     # {指标: {count, sum, mean, max, buckets}, 'counters': {计数器: 值}}
+    result = {'counters': dict(counters)}
+    for name, histogram in histograms.items():
+        count = histogram.count
+        result[name] = {
+            'count': count,
+            'sum': histogram.sum,
+            'mean': histogram.sum / count if count else 0.0,
+            'max': histogram.max,
+            'buckets': dict(zip([str(bound) for bound in BUCKETS] + ['+Inf'], histogram.counts)),
+        }
+    return result
+
+
+def prometheus():   # Prometheus 文本格式
+    lines = []
+    for name, histogram in sorted(histograms.items()):
+        metric = 'blockchain_%s_seconds' % name
+        lines.append('# TYPE %s histogram' % metric)
+        cumulative = 0
+        for bound, count in zip([repr(bound) for bound in BUCKETS] + ['+Inf'], histogram.counts):
+            cumulative += count
+            lines.append('%s_bucket{le="%s"} %d' % (metric, bound, cumulative))
+        lines.append('%s_sum %r' % (metric, histogram.sum))
+        lines.append('%s_count %d' % (metric, cumulative))
+    for name, value in sorted(counters.items()):
+        lines.append('# TYPE blockchain_%s_total counter' % name)
+        lines.append('blockchain_%s_total %d' % (name, value))
+    return '\n'.join(lines) + '\n'
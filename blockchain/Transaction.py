@@ -0,0 +1,88 @@
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import rsa
+
+from Codec import encode_transaction
+
+
+def make_transaction(sender, recipient, amount, fee=0, nonce=None):
+    transaction = {'sender': sender, 'recipient': recipient, 'amount': amount}
+    if fee:
+        transaction['fee'] = fee
+    if nonce is not None:
+        transaction['nonce'] = nonce
+    return transaction
+
+
+def transaction_body(transaction):     # 签名覆盖的内容: 除签名外的全部字段
+    return {key: value for key, value in transaction.items() if key != 'signature'}
+
+
+def transaction_id(transaction):
+    return hashlib.sha256(encode_transaction(transaction_body(transaction))).hexdigest()
+
+
+def sign_transaction(transaction, private_key):
+    message = encode_transaction(transaction_body(transaction))
+    if hasattr(private_key, 'ed25519'):
+        return private_key.sign(message)
+    return rsa.sign(message, private_key, 'SHA-256')
+
+
+def verify_transaction(transaction):     # 签名交易必须带 nonce, 否则同一笔签名可以被重复上链
+    signature = transaction.get('signature')
+    if signature is None or 'nonce' not in transaction:
+        return False
+    message = encode_transaction(transaction_body(transaction))
+    sender = transaction['sender']
+    if hasattr(sender, 'ed25519'):
+        return sender.verify(signature, message)
+    try:
+        rsa.verify(message, signature, sender)
+    except (rsa.VerificationError, AttributeError, TypeError):
+        return False
+    return True
+
+
+def verify_batch(transactions):
+    return [verify_transaction(transaction) for transaction in transactions]
+
+
+class SignatureVerifier:     # 批量验签: 进程池并行 + 已验证交易缓存
+    def __init__(self, workers=1, cache_size=100000):
+        self.workers = workers
+        self.cache_size = cache_size
+        self.verified = OrderedDict()   # (交易 id, 签名) -> None, 超出容量时淘汰最早的
+        self.executor = None
+
+    def verify(self, transactions):     # 返回与 transactions 对应的验签结果列表
+        keys = [(transaction_id(transaction), transaction.get('signature')) for transaction in transactions]
+        todo = [i for i, key in enumerate(keys) if key not in self.verified]
+        results = [True] * len(transactions)
+        checked = self.verify_uncached([transactions[i] for i in todo])
+        for i, ok in zip(todo, checked):
+            results[i] = ok
+            if ok:
+                self.remember(keys[i])
+        return results
+
+    def verify_uncached(self, transactions):
+        if self.workers <= 1 or len(transactions) < self.workers * 2:
+            return verify_batch(transactions)
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        size = -(-len(transactions) // (self.workers * 4))     # 按批提交, 减少进程间往返
+        batches = [transactions[i:i+size] for i in range(0, len(transactions), size)]
+        return [ok for batch in self.executor.map(verify_batch, batches) for ok in batch]
+
+    def remember(self, key):
+        self.verified[key] = None
+        if len(self.verified) > self.cache_size:
+            self.verified.popitem(last=False)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
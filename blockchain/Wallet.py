@@ -1,19 +1,35 @@
-import rsa
+from KeyProvider import default_provider
+from Ledger import scan_balance
+from Transaction import make_transaction, sign_transaction
 
 class Wallet:
-    def __init__(self):
-        self.public_key,self.private_key =rsa.newkeys(512)
+    def __init__(self,key_provider=None):
+        self.key_provider = key_provider or default_provider()
+        self.keys = None        # 第一次用到密钥时才生成
+
+    @property
+    def public_key(self):
+        return self.materialize()[0]
+
+    @property
+    def private_key(self):
+        return self.materialize()[1]
+
+    def materialize(self):
+        if self.keys is None:
+            self.keys = self.key_provider.new_keys()
+        return self.keys
 
     def get_balance(self,blockchain):
-        balance = 0
-        for block in blockchain.chain:
-            for transaction in block.data:
-                if 'recipient' in transaction and transaction['recipient'] == self.public_key:
-                    balance += transaction['amount']
-                if 'sender' in transaction and transaction['sender'] == self.public_key:
-                    balance -=transaction['amount']
-        return balance
+        if hasattr(blockchain, 'ledger'):      # 有余额索引时 O(1) 查询
+            return blockchain.get_balance(self.public_key)
+        return scan_balance(blockchain.chain, self.public_key)
     
-    def send_transaction(self,recipient,amount,blockchain):
-        if self.get_balance(blockchain) >= amount:
-            blockchain.add_transaction(self.public_key,recipient,amount)
\ No newline at end of file
+    def sign(self,recipient,amount,fee=0,nonce=None):     # 用私钥签名一笔转出交易
+        return sign_transaction(make_transaction(self.public_key,recipient,amount,fee,nonce),self.private_key)
+
+    def send_transaction(self,recipient,amount,blockchain,fee=0,nonce=None):
+        if nonce is None:       # 签名交易必须带 nonce, 默认取链上和交易池之后的下一个
+            nonce = blockchain.next_nonce(self.public_key)
+        if self.get_balance(blockchain) >= amount + fee:
+            blockchain.add_transaction(self.public_key,recipient,amount,self.sign(recipient,amount,fee,nonce),fee,nonce)
@@ -0,0 +1,390 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from Block import Block, block_header, decode_block, encode_block
+from Blockchain import Blockchain
+from BlockStore import BlockStore
+from Codec import encode
+from CompactBlock import CompactBlock
+from Cryptocurrency import Cryptocurrency
+from KeyProvider import Ed25519KeyProvider, KeyPool, RsaKeyProvider
+from Ledger import scan_balance
+from LightClient import LightClient
+from Mining import NONCE, mine
+from Node import Node
+from Transaction import SignatureVerifier, sign_transaction
+from Wallet import Wallet
+import Stats
+
+
+def timeit(func, repeat=1):     # 返回单次平均耗时(秒)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def build_cryptocurrency(tx_count, tx_per_block=1000, addresses=1000):
+    cryptocurrency = Cryptocurrency(verify_signatures=False)     # 测试地址为字符串, 不签名
+    cryptocurrency.create_genesis_block()
+    for i in range(tx_count):
+        cryptocurrency.add_transaction('addr%d' % (i % addresses), 'addr%d' % ((i * 7 + 1) % addresses), 1)
+        if (i + 1) % tx_per_block == 0:
+            cryptocurrency.mine_block('miner')
+    cryptocurrency.mine_block('miner')
+    return cryptocurrency
+
+
+def bench_balance(args):    # 全链扫描 vs 余额索引
+    results = []
+    for size in args.sizes:
+        cryptocurrency = build_cryptocurrency(size, args.tx_per_block)
+        address = 'addr1'
+        scan = timeit(lambda: scan_balance(cryptocurrency.chain, address), args.repeat)
+        index = timeit(lambda: cryptocurrency.get_balance(address), 10000)
+        rebuild = timeit(cryptocurrency.rebuild_ledger)
+        results.append({'transactions': size, 'scan_s': scan, 'index_s': index, 'rebuild_s': rebuild})
+        print("%9d 笔交易: 扫描 %.6fs  索引 %.9fs  重建 %.3fs" % (size, scan, index, rebuild))
+    return results
+
+
+def bench_validate(args):   # 顺序校验 vs 进程池并行校验
+    results = []
+    for size in args.sizes:
+        blockchain = Blockchain()
+        for i in range(size):
+            blockchain.add_block("t %d" % i)
+        sequential = timeit(blockchain.validate_chain)
+        print("%9d 个区块: 顺序校验 %.3fs" % (size, sequential))
+        for workers in args.workers:
+            parallel = timeit(lambda: blockchain.validate_chain(parallel=True, workers=workers))
+            results.append({'blocks': size, 'workers': workers, 'sequential_s': sequential, 'parallel_s': parallel})
+            print("%9d 个区块: %d 进程并行 %.3fs (加速 %.2fx)" % (size, workers, parallel, sequential / parallel))
+    return results
+
+
+def bench_block(args):      # Block vs CompactBlock: 单块内存(各块共用同一份交易数据)与校验时重算 hash(含数据摘要)的吞吐
+    results = []
+    data = [{'sender': 'addr%d' % i, 'recipient': 'addr%d' % (i + 1), 'amount': i} for i in range(args.tx_per_block)]
+    for size in args.sizes:
+        for block_class in (Block, CompactBlock):
+            tracemalloc.start()
+            blocks = []
+            previous_hash = "0"
+            for _ in range(size):
+                block = block_class(data, previous_hash)
+                previous_hash = block.hash
+                blocks.append(block)
+            memory = tracemalloc.get_traced_memory()[0] / size
+            tracemalloc.stop()
+            rehash = timeit(lambda: [block.calculate_hash() for block in blocks])
+            results.append({'blocks': size, 'class': block_class.__name__, 'bytes_per_block': memory, 'rehash_per_s': size / rehash})
+            print("%9d 个 %-12s 每块 %.0f 字节  重算 hash %.0f 块/秒" % (size, block_class.__name__, memory, size / rehash))
+        digest = sys.getsizeof(bytes(32)) + 8       # CompactBlock 保存的 32 字节 hash 对象 + 一个槽位
+        results.append({'blocks': size, 'class': 'CompactBlock.digest', 'bytes_per_block': digest})
+        print("%9d 个 %-12s 其中保存 32 字节 hash 每块 %d 字节" % (size, 'CompactBlock', digest))
+    return results
+
+
+def bench_codec(args):      # 区块数据的 repr 与规范二进制编码
+    import rsa
+    keys = [rsa.newkeys(512)[0] for _ in range(20)]
+    results = []
+    for size in args.sizes:
+        data = [{'sender': keys[i % 20], 'recipient': keys[(i + 1) % 20], 'amount': i} for i in range(size)]
+        encode(data)    # 预热公钥编码缓存
+        repr_s = timeit(lambda: str(data).encode(), args.repeat)
+        encode_s = timeit(lambda: encode(data), args.repeat)
+        results.append({'transactions': size, 'repr_s': repr_s, 'encode_s': encode_s})
+        print("%9d 笔交易: repr %.4fs  规范编码 %.4fs (快 %.1fx)" % (size, repr_s, encode_s, repr_s / encode_s))
+    return results
+
+
+def bench_store(args):      # 文件存储: 追加写, 重新打开, 按高度随机读
+    results = []
+    data = [{'sender': 'addr%d' % i, 'recipient': 'addr%d' % (i + 1), 'amount': i} for i in range(args.tx_per_block)]
+    for size in args.sizes:
+        path = tempfile.mkdtemp()
+        try:
+            store = BlockStore(path)
+            blockchain = Blockchain(store=store)
+            append = timeit(lambda: [blockchain.add_block(data) for _ in range(size)])
+            store.close()
+            reopen = timeit(lambda: BlockStore(path).close())
+            store = BlockStore(path)
+            heights = [random.randrange(len(store)) for _ in range(1000)]
+            read = timeit(lambda: [store[height] for height in heights]) / len(heights)
+            store.close()
+        finally:
+            shutil.rmtree(path)
+        results.append({'blocks': size, 'append_per_s': size / append, 'reopen_s': reopen, 'read_s': read})
+        print("%9d 个区块: 追加 %.0f 块/秒  重新打开 %.4fs  随机读 %.6fs" % (size, size / append, reopen, read))
+    return results
+
+
+def bench_mine(args):       # 每个进程数下的挖矿哈希率, 难度 256 不可能满足, 每个进程固定尝试 --hashes 次
+    results = []
+    prefix = block_header(time.time(), bytes(32), bytes(32))[:-NONCE.size]    # 与 Block 挖矿时相同的区块头前缀
+    for workers in args.workers:
+        elapsed = timeit(lambda: mine(prefix, 256, workers, limit=args.hashes))
+        rate = workers * args.hashes / elapsed
+        results.append({'workers': workers, 'hashes_per_s': rate})
+        print("%2d 进程: %.0f hash/秒" % (workers, rate))
+    return results
+
+
+def bench_verify(args):     # 每个进程数下的验签吞吐, 以及缓存命中后的重复验证
+    import rsa
+    keys = [rsa.newkeys(512) for _ in range(20)]
+    transactions = []
+    for i in range(args.sizes[0]):
+        public_key, private_key = keys[i % 20]
+        transaction = {'sender': public_key, 'recipient': keys[(i + 1) % 20][0], 'amount': i, 'nonce': i // 20}
+        transaction['signature'] = sign_transaction(transaction, private_key)
+        transactions.append(transaction)
+    results = []
+    for workers in args.workers:
+        verifier = SignatureVerifier(workers)
+        cold = timeit(lambda: verifier.verify(transactions))
+        warm = timeit(lambda: verifier.verify(transactions))
+        verifier.close()
+        results.append({'workers': workers, 'verify_per_s': len(transactions) / cold, 'cached_per_s': len(transactions) / warm})
+        print("%2d 进程: 验签 %.0f 笔/秒  缓存命中 %.0f 笔/秒" % (workers, len(transactions) / cold, len(transactions) / warm))
+    return results
+
+
+def bench_wallets(args):    # 创建钱包并生成密钥的耗时, 按密钥来源比较
+    providers = [('rsa', RsaKeyProvider)]
+    try:
+        Ed25519KeyProvider()
+        providers.append(('ed25519', Ed25519KeyProvider))
+    except ImportError:
+        print("未安装 cryptography, 跳过 ed25519")
+    results = []
+    for size in args.sizes:
+        for name, provider_class in providers:
+            create = timeit(lambda: [Wallet(provider_class()) for _ in range(size)])
+            provider = provider_class()
+            materialize = timeit(lambda: [Wallet(provider).public_key for _ in range(size)])
+            pool = KeyPool(provider, size=size, workers=max(args.workers))
+            pooled = timeit(lambda: [Wallet(pool).public_key for _ in range(size)])
+            pool.close()
+            results.append({'wallets': size, 'keys': name, 'create_s': create, 'materialize_s': materialize, 'pool_s': pooled})
+            print("%9d 个钱包 %-8s 创建 %.3fs  生成密钥 %.3fs  %d 进程密钥池 %.3fs" % (size, name, create, materialize, max(args.workers), pooled))
+    return results
+
+
+def bench_snapshot(args):   # 从创世区块重放 vs 从快照恢复余额
+    results = []
+    for size in args.sizes:
+        cryptocurrency = build_cryptocurrency(size, args.tx_per_block)
+        path = tempfile.mktemp()
+        try:
+            save = timeit(lambda: cryptocurrency.save_snapshot(path))
+            replay = timeit(cryptocurrency.rebuild_ledger)
+            restore = timeit(lambda: cryptocurrency.load_snapshot(path))
+        finally:
+            os.remove(path)
+        results.append({'transactions': size, 'save_s': save, 'replay_s': replay, 'restore_s': restore})
+        print("%9d 笔交易: 写快照 %.3fs  全量重放 %.3fs  快照恢复 %.3fs" % (size, save, replay, restore))
+    return results
+
+
+def bench_light(args):      # 轻客户端: 区块头占用 vs 完整链编码大小, 余额证明的生成与验证
+    results = []
+    for size in args.sizes:
+        cryptocurrency = build_cryptocurrency(size, args.tx_per_block)
+        for i in range(1000):       # 测试交易收支相抵, 另发一笔使每个地址余额非 0
+            cryptocurrency.add_transaction('faucet', 'addr%d' % i, i + 1)
+        cryptocurrency.mine_block('miner')
+        client = LightClient(cryptocurrency.chain[0].hash, cryptocurrency.difficulty)
+        sync = timeit(lambda: client.sync_from(cryptocurrency.chain))
+        full = sum(len(encode_block(block)) for block in cryptocurrency.chain)
+        addresses = ['addr%d' % i for i in range(100)]
+        proofs = []
+        prove = timeit(lambda: proofs.extend(cryptocurrency.get_balance_proof(address) for address in addresses))
+        verify = timeit(lambda: all(client.verify_balance(address, balance, proof, height)
+                                    for address, (height, balance, proof) in zip(addresses, proofs)))
+        results.append({'transactions': size, 'header_bytes': client.memory(), 'chain_bytes': full,
+                        'sync_s': sync, 'proofs_per_s': len(addresses) / prove, 'verify_per_s': len(addresses) / verify})
+        print("%9d 笔交易: 区块头 %d 字节 / 完整链 %d 字节 (%.2f%%)  生成证明 %.0f/s  验证 %.0f/s" % (
+            size, client.memory(), full, 100.0 * client.memory() / full, len(addresses) / prove, len(addresses) / verify))
+    return results
+
+
+def bench_suite(args):      # 核心路径吞吐: add_block, mine_block, validate_chain, get_balance, 序列化
+    results = []
+    for size in args.sizes:
+        random.seed(args.seed)
+        data = ["t %d" % i for i in range(size)]
+        blockchain = Blockchain()
+        add = timeit(lambda: [blockchain.add_block(item) for item in data])
+        validate = timeit(blockchain.validate_chain)
+
+        cryptocurrency = Cryptocurrency(verify_signatures=False)
+        cryptocurrency.create_genesis_block()
+        blocks = max(size // args.tx_per_block, 1)
+        addresses = ['addr%d' % i for i in range(1000)]
+
+        def mine_all():
+            for _ in range(blocks):
+                for _ in range(args.tx_per_block):
+                    cryptocurrency.add_transaction(random.choice(addresses), random.choice(addresses), 1)
+                cryptocurrency.mine_block('miner')
+        mine_s = timeit(mine_all)
+        queries = [random.choice(addresses) for _ in range(10000)]
+        balance = timeit(lambda: [cryptocurrency.get_balance(address) for address in queries])
+        records = []
+        encode_s = timeit(lambda: records.extend(encode_block(block) for block in cryptocurrency.chain))
+        decode_s = timeit(lambda: [decode_block(record) for record in records])
+
+        result = {
+            'blocks': size,
+            'tx_per_block': args.tx_per_block,
+            'add_block_per_s': size / add,
+            'validate_blocks_per_s': size / validate,
+            'mine_blocks_per_s': blocks / mine_s,
+            'mine_tx_per_s': blocks * args.tx_per_block / mine_s,
+            'get_balance_per_s': len(queries) / balance,
+            'encode_blocks_per_s': len(records) / encode_s,
+            'decode_blocks_per_s': len(records) / decode_s,
+        }
+        results.append(result)
+        for key, value in result.items():
+            print("%-24s %12.0f" % (key, value))
+    return results
+
+
+def bench_sync(args):       # 新节点通过本地 TCP 从已有节点同步整条链的速度
+    results = []
+    for size in args.sizes:
+        source = Cryptocurrency(verify_signatures=False)
+        source.create_genesis_block()
+        for _ in range(size):
+            source.mine_block('miner')
+
+        async def run():
+            seed, fresh = Node(source), Node(Cryptocurrency(verify_signatures=False))
+            await seed.start()
+            start = time.perf_counter()
+            await fresh.connect('127.0.0.1', seed.port)
+            while fresh.height() < seed.height():
+                await asyncio.sleep(0.001)
+            elapsed = time.perf_counter() - start
+            await fresh.stop()
+            await seed.stop()
+            return elapsed
+        elapsed = asyncio.run(run())
+        results.append({'blocks': size, 'sync_s': elapsed, 'sync_blocks_per_s': size / elapsed})
+        print("%9d 个区块: 同步 %.3fs (%.0f 块/秒)" % (size, elapsed, size / elapsed))
+    return results
+
+
+def bench_import(args):     # 逐块 add_block 导入 vs extend 批量导入(顺序/并行)
+    results = []
+    for size in args.sizes:
+        source = Cryptocurrency(verify_signatures=False)
+        source.create_genesis_block()
+        for i in range(size):       # 每块一笔转账, 两条路径都要检查状态根
+            source.add_transaction('faucet', 'addr%d' % (i % 1000), 1)
+            source.mine_block('miner')
+        blocks = list(source.chain)
+
+        def loop():
+            target = Cryptocurrency(verify_signatures=False)
+            for block in blocks:
+                target.add_block(block)
+        looped = timeit(loop)
+        result = {'blocks': size, 'add_block_s': looped}
+        print("%9d 个区块: 逐块 add_block %.3fs" % (size, looped))
+        for workers in [0] + args.workers:
+            elapsed = timeit(lambda: Cryptocurrency(verify_signatures=False).extend(blocks, parallel=workers > 0, workers=workers))
+            result['extend_%d_s' % workers] = elapsed
+            print("%9d 个区块: extend %s %.3fs (快 %.1fx)" % (size, "%d 进程" % workers if workers else "顺序", elapsed, looped / elapsed))
+        results.append(result)
+    return results
+
+
+def compare(results, baseline, tolerance):     # 与基准结果比较, 返回退化的指标
+    regressions = []
+    for current, previous in zip(results, baseline):
+        for key, value in current.items():
+            old = previous.get(key)
+            if not isinstance(value, float) or not old:
+                continue
+            if key.endswith('_per_s'):      # 吞吐越大越好
+                change = (old - value) / old
+            elif key.endswith('_s'):        # 耗时越小越好
+                change = (value - old) / old
+            else:
+                continue
+            if change > tolerance:
+                regressions.append((key, old, value, change))
+    return regressions
+
+
+BENCHMARKS = {
+    'block': bench_block,
+    'codec': bench_codec,
+    'import': bench_import,
+    'light': bench_light,
+    'mine': bench_mine,
+    'snapshot': bench_snapshot,
+    'store': bench_store,
+    'suite': bench_suite,
+    'sync': bench_sync,
+    'verify': bench_verify,
+    'wallets': bench_wallets,
+    'balance': bench_balance,
+    'validate': bench_validate,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="区块链性能测试")
+    parser.add_argument('name', choices=sorted(BENCHMARKS))
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--tx-per-block', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--hashes', type=int, default=1 << 20)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="把结果写入 JSON 文件")
+    parser.add_argument('--baseline', help="与之前 --json 输出的结果比较, 有退化时退出码为 1")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="允许的退化比例")
+    parser.add_argument('--stats', action='store_true', help="开启 Stats 统计并输出 Prometheus 文本")
+    args = parser.parse_args()
+    random.seed(args.seed)
+    if args.stats:
+        Stats.enable()
+    results = BENCHMARKS[args.name](args)
+    if args.stats:
+        print(Stats.prometheus())
+    report = {
+        'benchmark': args.name,
+        'args': vars(args),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'results': results,
+        'stats': Stats.snapshot() if args.stats else None,
+    }
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)['results'], args.tolerance)
+        for key, old, new, change in regressions:
+            print("退化: %s %.4g -> %.4g (%.0f%%)" % (key, old, new, change * 100))
+        if regressions:
+            sys.exit(1)
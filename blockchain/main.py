@@ -16,7 +16,7 @@ if __name__ =="__main__":
     wallet1 = Wallet()
     wallet2 = Wallet()
 
-    cryptocurrency.add_transaction(wallet1.public_key,wallet2.public_key,10)
+    cryptocurrency.add_transaction(wallet1.public_key,wallet2.public_key,10,wallet1.sign(wallet2.public_key,10,nonce=0),nonce=0)
     cryptocurrency.mine_block(wallet1.public_key)
 
     print("账户1余额:", wallet1.get_balance(cryptocurrency))
@@ -5,8 +5,14 @@ drop table if EXISTS `tb_top_movie`;
 
 create table `tb_top_movie` (
     `mov_id` int UNSIGNED AUTO_INCREMENT COMMENT 'No',
+    `douban_id` int UNSIGNED not null COMMENT 'douban subject id',
     `title` varchar(50) not null COMMENT 'title',
     `rating` DECIMAL(3,1) not null COMMENT 'score',
     `subject` varchar(200) DEFAULT '' COMMENT 'subject',
-    PRIMARY key (`mov_id`)
+    `director` varchar(100) DEFAULT '' COMMENT 'director',
+    `year` smallint UNSIGNED DEFAULT 0 COMMENT 'year',
+    `genres` varchar(100) DEFAULT '' COMMENT 'genres',
+    `votes` int UNSIGNED DEFAULT 0 COMMENT 'votes',
+    PRIMARY key (`mov_id`),
+    UNIQUE key `uk_douban_id` (`douban_id`)
     ) engine=innodb COMMENT='TopMovie250'
\ No newline at end of file
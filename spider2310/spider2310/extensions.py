@@ -0,0 +1,48 @@
+# Crawl statistics extension
+#
+# See documentation in:
+# https://docs.scrapy.org/en/latest/topics/extensions.html
+
+import time
+
+from scrapy import signals
+
+
+class CrawlStatsExtension:
+    # 爬取结束时统计页面吞吐 (页/秒) 和下载延迟分位数, 写入 crawler.stats 并打印
+    PERCENTILES = (50, 90, 99)
+
+    def __init__(self, stats):
+        self.stats = stats
+        self.latencies = []     # 每个响应的 download_latency (秒)
+        self.started = 0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        ext = cls(crawler.stats)
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.response_received, signal=signals.response_received)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def spider_opened(self, spider):
+        self.started = time.time()
+
+    def response_received(self, response, request, spider):
+        latency = request.meta.get('download_latency')
+        if latency is not None:
+            self.latencies.append(latency)
+
+    def spider_closed(self, spider):
+        elapsed = max(time.time() - self.started, 1e-6)
+        pages = len(self.latencies)
+        self.stats.set_value('crawl/pages_per_second', round(pages / elapsed, 2))
+        if not pages:
+            return
+        self.latencies.sort()
+        values = []
+        for p in self.PERCENTILES:
+            value = self.latencies[min(pages - 1, pages * p // 100)]
+            self.stats.set_value('crawl/latency_p%d' % p, round(value, 3))
+            values.append('p%d %.3fs' % (p, value))
+        spider.logger.info('%d 个页面, %.2f 页/秒, 下载延迟 %s', pages, pages / elapsed, ', '.join(values))
@@ -7,6 +7,11 @@ import scrapy
 
 
 class MovieItem(scrapy.Item):
+   douban_id = scrapy.Field()     # 详情页 /subject/<id>/ 中的 id, 作为入库的唯一键
    title = scrapy.Field()
    rank = scrapy.Field()
    subject = scrapy.Field()
+   director = scrapy.Field()      # 以下字段来自详情页
+   year = scrapy.Field()
+   genres = scrapy.Field()
+   votes = scrapy.Field()
@@ -5,47 +5,240 @@
 
 
 # useful for handling different item types with a single interface
+import csv
+import os
+import time
+
 from itemadapter import ItemAdapter
 import openpyxl
-import pymysql
+from scrapy.exceptions import NotConfigured
+from twisted.enterprise import adbapi
+from twisted.internet import defer, task
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:     # Parquet 导出是可选的
+    pa = pq = None
+
+EXPORT_FIELDS = ('douban_id','title','rank','subject','director','year','genres','votes')       # 导出的 item 字段及对应的表头
+EXPORT_HEADERS = ('douban_id','title','score','subject','director','year','genres','votes')
 
 class DbPipeline:
-    def __init__(self):
-        self.conn = pymysql.connect(host='127.0.0.1',port=3306,user='root',password='123456',database='spider',charset='utf8mb4')
-        self.cursor = self.conn.cursor()
+    # 异步写库: 数据攒批后交给 twisted adbapi 连接池在线程中执行, 不阻塞 reactor
+    # 按 douban_id 幂等写入, 内容未变化的 item 在内存中直接跳过
+    def __init__(self,params,batch_size=100,flush_interval=5.0,pool_size=3,stats=None):
+        self.params = params
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pool_size = pool_size
+        self.stats = stats
+        self.pool = None
+        self.loop = None
         self.data=[]
+        self.seen = {}      # douban_id -> 已入库的 (title, rating, subject)
+        self.pending = set()
+        self.rows = 0
+        self.started = 0
+
+    @classmethod
+    def from_crawler(cls,crawler):
+        settings = crawler.settings
+        params = dict(host=settings.get('MYSQL_HOST','127.0.0.1'),port=settings.getint('MYSQL_PORT',3306),
+                      user=settings.get('MYSQL_USER','root'),password=settings.get('MYSQL_PASSWORD','123456'),
+                      database=settings.get('MYSQL_DATABASE','spider'),charset='utf8mb4')
+        return cls(params,settings.getint('MYSQL_BATCH_SIZE',100),settings.getfloat('MYSQL_FLUSH_INTERVAL',5.0),
+                   settings.getint('MYSQL_POOL_SIZE',3),crawler.stats)
+
+    def open_spider(self,spider):
+        self.pool = adbapi.ConnectionPool('pymysql',cp_min=1,cp_max=self.pool_size,cp_reconnect=True,**self.params)
+        self.started = time.time()
+        self.loop = task.LoopingCall(self.flush,spider)     # 数据不足一批时也定时写入
+        self.loop.start(self.flush_interval,now=False)
+        d = self.pool.runQuery('select douban_id,title,rating,subject,director,year,genres,votes from tb_top_movie')   # 预加载已入库的数据
+        d.addCallback(self._preload)
+        return d
+
+    def _preload(self,rows):
+        for row in rows:
+            self.seen[row[0]] = _row(*row[1:])
+
     def close_spider(self,spider):
-        if len(self.data) > 0:
-            self._write_to_db()
-        self.conn.close()
-        
+        if self.loop.running:
+            self.loop.stop()
+        self.flush(spider)
+        d = defer.DeferredList(list(self.pending))     # 返回 Deferred, scrapy 等待所有批次写完再关闭
+        d.addBoth(lambda _: self._close(spider))
+        return d
+
     def process_item(self,item,spider):
-        title = item.get('title','')
-        rank = item.get('rank',0)
-        subject = item.get('subject','')
-        self.data.append((title,rank,subject))
-        if len(self.data==100):
-            self._write_to_db()
-            self.data.clear()
+        douban_id = item['douban_id']
+        row = _row(item.get('title',''),item.get('rank',0),item.get('subject',''),item.get('director',''),
+                   item.get('year',0),item.get('genres',''),item.get('votes',0))
+        if self.seen.get(douban_id) == row:
+            if self.stats is not None:
+                self.stats.inc_value('mysql/skipped')
+            return item
+        self.seen[douban_id] = row
+        self.data.append((douban_id,)+row)
+        if len(self.data) >= self.batch_size:
+            self.flush(spider)
+        if len(self.pending) > self.pool_size:     # 写库跟不上时暂缓后续 item, 避免批次无限堆积
+            d = defer.DeferredList(list(self.pending))
+            d.addBoth(lambda _: item)
+            return d
         return item
-    
-    def _write_to_db(self):
-        self.cursor.executemany('insert into tb_top_movie (title,rating,subject) values (%s,%s,%s)',self.data)
-        self.conn.commit()
-        
+
+    def flush(self,spider):
+        if not self.data:
+            return
+        rows,self.data = self.data,[]
+        d = self.pool.runInteraction(self._write_to_db,rows)
+        d.addCallback(self._written,len(rows))
+        d.addErrback(self._failed,rows,spider)
+        self.pending.add(d)
+        d.addBoth(lambda _: self.pending.discard(d))
+
+    def _write_to_db(self,cursor,rows):    # 在连接池线程中执行, runInteraction 成功后自动 commit
+        cursor.executemany('insert into tb_top_movie (douban_id,title,rating,subject,director,year,genres,votes) '
+                           'values (%s,%s,%s,%s,%s,%s,%s,%s) '
+                           'on duplicate key update title=values(title),rating=values(rating),subject=values(subject),'
+                           'director=values(director),year=values(year),genres=values(genres),votes=values(votes)',rows)
+
+    def _written(self,_,count):
+        self.rows += count
+        if self.stats is not None:
+            self.stats.inc_value('mysql/rows',count)
+
+    def _failed(self,failure,rows,spider):     # 写入失败的行移出 seen, 之后再次出现时重新写入
+        for row in rows:
+            self.seen.pop(row[0],None)
+        spider.logger.error('写入 tb_top_movie 失败: %s',failure.getErrorMessage())
+
+    def _close(self,spider):
+        self.pool.close()
+        elapsed = max(time.time()-self.started,1e-6)
+        if self.stats is not None:
+            self.stats.set_value('mysql/rows_per_second',round(self.rows/elapsed,1))
+        spider.logger.info('写入 tb_top_movie %d 行, %.1f 行/秒',self.rows,self.rows/elapsed)
+
+def _row(title,rating,subject,director,year,genres,votes):     # 统一库中和页面上的格式, 用于判断内容是否变化
+    return (title or '','%.1f' % float(rating or 0),subject or '',director or '',int(year or 0),genres or '',int(votes or 0))
+
+
+def _export_row(item):
+    return tuple(item.get(field,'') for field in EXPORT_FIELDS)
+
+
 class ExcelPipeline:
-    def __init__(self):
-        self.wb = openpyxl.Workbook()
-        self.ws = self.wb.active
-        self.ws.title = 'Top250'
-        self.ws.append(('title','score','subject'))
-     
+    # 流式写 Excel: write-only 工作表逐行落到临时文件, 内存不随行数增长
+    # 每个工作表写满后换新表, 每个文件写满后保存并换新文件, 崩溃时只丢失当前文件
+    def __init__(self,path='moiveData.xlsx',rows_per_sheet=100,sheets_per_file=1):
+        self.path = path
+        self.rows_per_sheet = rows_per_sheet
+        self.sheets_per_file = sheets_per_file
+        self.files = 0
+        self.wb = None
+        self.ws = None
+        self.sheets = 0
+        self.rows = 0
+
+    @classmethod
+    def from_crawler(cls,crawler):
+        settings = crawler.settings
+        return cls(settings.get('EXCEL_FILE','moiveData.xlsx'),settings.getint('EXCEL_ROWS_PER_SHEET',100),
+                   settings.getint('EXCEL_SHEETS_PER_FILE',1))
+
+    def close_spider(self,spider):
+        if self.wb is not None:
+            self._save()
+
+    def process_item(self, item, spider):
+        if self.ws is None or self.rows >= self.rows_per_sheet:
+            self._new_sheet()
+        self.ws.append(_export_row(item))
+        self.rows += 1
+        return item
+
+    def _new_sheet(self):
+        if self.wb is not None and self.sheets >= self.sheets_per_file:
+            self._save()
+        if self.wb is None:
+            self.wb = openpyxl.Workbook(write_only=True)
+            self.sheets = 0
+        self.sheets += 1
+        self.ws = self.wb.create_sheet('Top250' if self.sheets == 1 else 'Top250-%d' % self.sheets)
+        self.ws.append(EXPORT_HEADERS)
+        self.rows = 0
+
+    def _save(self):    # 第一个文件沿用原文件名, 之后为 moiveData-2.xlsx, moiveData-3.xlsx ...
+        self.files += 1
+        root,ext = os.path.splitext(self.path)
+        self.wb.save(self.path if self.files == 1 else '%s-%d%s' % (root,self.files,ext))
+        self.wb = None
+
+
+class CsvPipeline:      # 逐行写 CSV, 每 flush_rows 行刷一次盘
+    def __init__(self,path='moiveData.csv',flush_rows=1000):
+        self.path = path
+        self.flush_rows = flush_rows
+        self.file = None
+        self.writer = None
+        self.rows = 0
+
+    @classmethod
+    def from_crawler(cls,crawler):
+        settings = crawler.settings
+        return cls(settings.get('CSV_FILE','moiveData.csv'),settings.getint('CSV_FLUSH_ROWS',1000))
+
+    def open_spider(self,spider):
+        self.file = open(self.path,'w',newline='',encoding='utf-8-sig')     # 带 BOM, Excel 打开不乱码
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(EXPORT_HEADERS)
+
     def close_spider(self,spider):
-        self.wb.save('moiveData.xlsx')
-             
+        self.file.close()
+
     def process_item(self, item, spider):
-        title = item.get('title','')
-        rank = item.get('rank','')
-        subject = item.get('subject','')
-        self.ws.append((title,rank,subject))
+        self.writer.writerow(_export_row(item))
+        self.rows += 1
+        if self.rows % self.flush_rows == 0:
+            self.file.flush()
         return item
+
+
+class ParquetPipeline:      # 按 batch_size 行写一个 row group, 需要安装 pyarrow
+    def __init__(self,path='moiveData.parquet',batch_size=10000):
+        self.path = path
+        self.batch_size = batch_size
+        self.writer = None
+        self.data = []
+
+    @classmethod
+    def from_crawler(cls,crawler):
+        if pq is None:
+            raise NotConfigured('ParquetPipeline 需要 pyarrow')
+        settings = crawler.settings
+        return cls(settings.get('PARQUET_FILE','moiveData.parquet'),settings.getint('PARQUET_BATCH_SIZE',10000))
+
+    def open_spider(self,spider):
+        schema = pa.schema([(header,pa.string()) for header in EXPORT_HEADERS])
+        self.writer = pq.ParquetWriter(self.path,schema)
+
+    def close_spider(self,spider):
+        self._write()
+        self.writer.close()
+
+    def process_item(self, item, spider):
+        self.data.append(_export_row(item))
+        if len(self.data) >= self.batch_size:
+            self._write()
+        return item
+
+    def _write(self):
+        if not self.data:
+            return
+        columns = list(zip(*self.data))
+        arrays = [pa.array([None if value is None else str(value) for value in column],pa.string()) for column in columns]
+        self.writer.write_table(pa.Table.from_arrays(arrays,names=list(EXPORT_HEADERS)))
+        self.data = []
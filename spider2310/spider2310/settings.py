@@ -27,7 +27,7 @@ ROBOTSTXT_OBEY = True
 # See also autothrottle settings and docs
 #DOWNLOAD_DELAY = 3
 # The download delay setting will honor only one of:
-#CONCURRENT_REQUESTS_PER_DOMAIN = 16
+CONCURRENT_REQUESTS_PER_DOMAIN = 8
 #CONCURRENT_REQUESTS_PER_IP = 16
 
 # Disable cookies (enabled by default)
@@ -56,27 +56,49 @@ ROBOTSTXT_OBEY = True
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-#EXTENSIONS = {
+EXTENSIONS = {
 #    "scrapy.extensions.telnet.TelnetConsole": None,
-#}
+    "spider2310.extensions.CrawlStatsExtension": 500,
+}
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 ITEM_PIPELINES = {
     "spider2310.pipelines.ExcelPipeline": 300,
     "spider2310.pipelines.DbPipeline": 200,
+#    "spider2310.pipelines.CsvPipeline": 310,
+#    "spider2310.pipelines.ParquetPipeline": 320,
 }
 
+# 导出文件: Excel 每个工作表的行数和每个文件的工作表数, 写满后换新表/新文件
+EXCEL_FILE = "moiveData.xlsx"
+EXCEL_ROWS_PER_SHEET = 100      # Top250 每 4 页存一个文件, 崩溃时最多丢 100 行
+EXCEL_SHEETS_PER_FILE = 1
+CSV_FILE = "moiveData.csv"
+CSV_FLUSH_ROWS = 1000
+PARQUET_FILE = "moiveData.parquet"
+PARQUET_BATCH_SIZE = 10000
+
+# MySQL pipeline: 连接参数, 每批行数, 不足一批时的定时写入间隔(秒), 连接池大小
+MYSQL_HOST = "127.0.0.1"
+MYSQL_PORT = 3306
+MYSQL_USER = "root"
+MYSQL_PASSWORD = "123456"
+MYSQL_DATABASE = "spider"
+MYSQL_BATCH_SIZE = 100
+MYSQL_FLUSH_INTERVAL = 5.0
+MYSQL_POOL_SIZE = 3
+
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
-#AUTOTHROTTLE_ENABLED = True
+AUTOTHROTTLE_ENABLED = True
 # The initial download delay
-#AUTOTHROTTLE_START_DELAY = 5
+AUTOTHROTTLE_START_DELAY = 1
 # The maximum download delay to be set in case of high latencies
-#AUTOTHROTTLE_MAX_DELAY = 60
+AUTOTHROTTLE_MAX_DELAY = 10
 # The average number of requests Scrapy should be sending in parallel to
 # each remote server
-#AUTOTHROTTLE_TARGET_CONCURRENCY = 1.0
+AUTOTHROTTLE_TARGET_CONCURRENCY = 4.0
 # Enable showing throttling stats for every response received:
 #AUTOTHROTTLE_DEBUG = False
 
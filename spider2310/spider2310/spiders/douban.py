@@ -1,3 +1,5 @@
+import re
+
 import scrapy
 from scrapy import Request, Selector
 from spider2310.items import MovieItem
@@ -8,22 +10,49 @@ class DoubanSpider(scrapy.Spider):
     allowed_domains = ["movie.douban.com"]
     """start_urls = ["https://movie.douban.com/top250?start=0&filter="]"""
 
-    def start_requests(self):
-        for page in range(10):
-            yield Request(url=f'https://movie.douban.com/top250?start={page *25}&filter=')
-    def parse(self, response:HtmlResponse):
+    page_size = 25
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.detail_urls = set()    # 已调度的详情页, 不同列表页出现同一部电影时只抓一次
+
+    def start_requests(self):   # 只请求第一页, 其余页数由第一页上的总数算出
+        yield Request(url=self.page_url(0),cb_kwargs={'first_page':True})
+
+    def page_url(self, page):
+        return f'https://movie.douban.com/top250?start={page *self.page_size}&filter='
+
+    def parse(self, response:HtmlResponse, first_page=False):
         select = Selector(response)
+        if first_page:
+            total = select.css('div.paginator > span.count::text').re_first(r'\d+')    # "(共250条)"
+            pages = -(-int(total) // self.page_size) if total else 10   # 取不到总数时按 Top250 的 10 页
+            for page in range(1,pages):     # 每页只生成一次, 不需要经过去重过滤器
+                yield Request(url=self.page_url(page),dont_filter=True)
         list_items = select.css('#content > div > div.article > ol > li')
         for list_item in list_items:
             detail_url = list_item.css('div.info > div.hd > a::attr(href)').extract_first()
             movie_item = MovieItem()
+            movie_item['douban_id']=int(re.search(r'/subject/(\d+)',detail_url).group(1))
             movie_item['title']=list_item.css('span.title::text').extract_first()
             movie_item['rank']=list_item.css('span.rating_num::text').extract_first()
             movie_item['subject']=list_item.css('span.inq::text').extract_first()
+            if detail_url in self.detail_urls:
+                continue
+            self.detail_urls.add(detail_url)
+            yield Request(url=detail_url,callback=self.parse_detail,errback=self.detail_failed,
+                          cb_kwargs={'movie_item':movie_item},dont_filter=True)
+
 
+    def parse_detail(self, response:HtmlResponse, movie_item):    # 详情页补充导演、年份、类型和评价人数
+        info = response.css('#info')
+        movie_item['director']='/'.join(info.css('a[rel="v:directedBy"]::text').extract())
+        year = response.css('#content > h1 > span.year::text').re_first(r'\d{4}')
+        movie_item['year']=int(year) if year else None
+        movie_item['genres']='/'.join(info.css('span[property="v:genre"]::text').extract())
+        votes = response.css('span[property="v:votes"]::text').extract_first()
+        movie_item['votes']=int(votes) if votes else None
+        yield movie_item
 
-        hrefs_list =select.css('div.paginator > a::attr(href)')
-        for href in hrefs_list:
-            url = response.urljoin(href.extract())
-            yield Request(url=url)
-            
\ No newline at end of file
+    def detail_failed(self, failure):     # 详情页抓取失败时仍然输出列表页上的字段
+        yield failure.request.cb_kwargs['movie_item']